@@ -1,16 +1,16 @@
+# time this run from before the page's own imports
+import profiling
+page_timer = profiling.start_page('Hello')
 import streamlit as st
-from PIL import Image
 from streamlit.logger import get_logger
-import pandas as pd
 from utils import create_header_triplet, initialise_session_states
+from assets import image_bytes
 
 LOGGER = get_logger(__name__)
 
 def display_member_image():
     # images come with width 960 - seems too much rescale
-    head = Image.open('Images/' + st.session_state.member + '.png')
-    head = head.resize((int(head.size[0] * 0.75), int(head.size[1]*0.75)))
-    st.image(head)
+    st.image(image_bytes('Images/' + st.session_state.member + '.png', scale=0.75))
 
 def on_member_change():
     st.session_state.member = st.session_state.selected_member
@@ -31,7 +31,8 @@ def run():
         layout="wide"
     )
 
-    initialise_session_states()
+    # the landing page only needs the member, not the meal data
+    initialise_session_states(load_data=False)
 
     _, _, select_box  = create_header_triplet()
 
@@ -43,3 +44,4 @@ def run():
 
 if __name__ == "__main__":
     run()
+    page_timer.rendered()
@@ -0,0 +1,83 @@
+import pandas as pd
+
+
+def add_totals(totals, new):
+    """
+    totals with new added in. New keys, the usual case for appended
+    days, are just appended, only keys already in totals are summed
+    """
+    combined = pd.concat([totals, new])
+    if combined.index.has_duplicates:
+        combined = combined.groupby(level=list(range(combined.index.nlevels)), sort=False).sum()
+    return combined
+
+
+class MealAggregates:
+    """
+    Derived tables shared by the pages, kept as running totals so
+    appending meals only groups the new rows and adds them in:
+        monthly - (Member, month) -> cost, Used
+        daily   - (Member, date, restaurant) -> visits
+    Each update replaces the tables rather than changing them, so a
+    copy can share them with the object it was copied from
+    """
+
+    def __init__(self):
+        self.monthly = None
+        self.daily = None
+
+    def update(self, df):
+        """
+        Adds the meals in df to the running totals
+        """
+        # plain string keys, the categories of new rows don't match the log's
+        member = df['Member'].astype(object).rename('Member')
+        months = df['date'].dt.to_period('M').rename('month')
+        monthly = df.groupby([member, months])['discount_meal_price'].agg(['sum', 'size'])
+        monthly.columns = ['cost', 'Used']
+        daily = df.groupby([member, df['date'].dt.normalize(), df['restaurant'].astype(object)]).size().rename('visits')
+
+        if self.monthly is not None:
+            monthly = add_totals(self.monthly, monthly)
+            daily = add_totals(self.daily, daily)
+        self.monthly = monthly.astype({'cost': float, 'Used': 'int64'})
+        self.daily = daily.astype('int64')
+        return self
+
+    def copy(self):
+        """
+        Copy to update without changing the totals an older data
+        version is still using
+        """
+        aggregates = MealAggregates()
+        aggregates.monthly, aggregates.daily = self.monthly, self.daily
+        return aggregates
+
+    def members(self):
+        if self.daily is None:
+            return []
+        return list(self.daily.index.unique(level='Member'))
+
+    def monthly_table(self):
+        """
+        Long format (Member, month, cost, Used) for every member
+        """
+        if self.monthly is None:
+            return pd.DataFrame(columns=['Member', 'month', 'cost', 'Used'])
+        return self.monthly.reset_index()
+
+    def daily_visits_frame(self, member):
+        """
+        Long format (date, restaurant, visits) of visits per day for member
+        """
+        if member not in self.members():
+            return pd.DataFrame(columns=['date', 'restaurant', 'visits'])
+        return self.daily.xs(member, level='Member').reset_index()
+
+    def all_daily_visits(self):
+        """
+        Long format (Member, date, restaurant, visits) for every member
+        """
+        if self.daily is None:
+            return pd.DataFrame(columns=['Member', 'date', 'restaurant', 'visits'])
+        return self.daily.reset_index()
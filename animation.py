@@ -0,0 +1,161 @@
+import time
+
+import streamlit as st
+from streamlit.logger import get_logger
+
+import profiling
+
+LOGGER = get_logger(__name__)
+
+DEFAULT_FPS = 4
+MAX_FPS = 20
+
+
+class FrameScheduler:
+    """
+    Paces a timer driven animation to a target frame rate. Each frame
+    asks how many days to advance - normally 1, more when the previous
+    frames took too long or the timer fired late, so the animation keeps
+    its speed by coalescing days instead of slowing down. Skipped days
+    count as dropped frames
+    """
+
+    def __init__(self, target_fps=DEFAULT_FPS, max_skip=7):
+        self.target_fps = target_fps
+        self.max_skip = max_skip
+        self.frames = 0
+        self.dropped = 0
+        self.busy_seconds = 0.0
+        self.active_seconds = 0.0
+        self.max_frame_seconds = 0.0
+        self._deadline = None
+        self._frame_start = None
+        self._previous_start = None
+        self._run_start = None
+
+    @property
+    def interval(self):
+        return 1 / self.target_fps
+
+    def start(self):
+        """
+        Call when the animation (re)starts, e.g. after a rerun
+        """
+        self._deadline = None
+        # a pause is not active time, the first frame after it counts one interval
+        self._frame_start = None
+        self._previous_start = None
+        self._run_start = time.perf_counter()
+
+    def begin_frame(self):
+        """
+        Returns the number of days this frame should advance
+        """
+        now = time.perf_counter()
+        self._previous_start, self._frame_start = self._frame_start, now
+        if self._deadline is None:
+            self._deadline = now
+            return 1
+
+        behind = int((now - self._deadline) // self.interval)
+        if behind <= 0:
+            return 1
+        skipped = min(behind, self.max_skip)
+        self.dropped += skipped
+        if behind > self.max_skip:
+            # too far behind to catch up, start the schedule again from now
+            self._deadline = now
+        else:
+            self._deadline += skipped * self.interval
+        return 1 + skipped
+
+    def end_frame(self):
+        """
+        Records the frame's work time. The next frame comes from the
+        timer, so nothing waits here
+        """
+        now = time.perf_counter()
+        frame_seconds = now - self._frame_start
+        self.frames += 1
+        self.busy_seconds += frame_seconds
+        self.max_frame_seconds = max(self.max_frame_seconds, frame_seconds)
+
+        self._deadline += self.interval
+        if self._previous_start is None:
+            self.active_seconds += self.interval
+        else:
+            self.active_seconds += self._frame_start - self._previous_start
+
+    def stats(self):
+        """
+        Achieved frame rate, dropped frames and frame work times
+        """
+        return {
+            'target_fps': self.target_fps,
+            'achieved_fps': self.frames / self.active_seconds if self.active_seconds else 0.0,
+            'frames': self.frames,
+            'dropped': self.dropped,
+            'mean_frame_seconds': self.busy_seconds / self.frames if self.frames else 0.0,
+            'max_frame_seconds': self.max_frame_seconds,
+        }
+
+
+def get_scheduler(name):
+    """
+    The page's scheduler, kept in session state so stats survive reruns
+    and the speed control applies to a running animation
+    """
+    key = f'{name}_scheduler'
+    if key not in st.session_state:
+        st.session_state[key] = FrameScheduler()
+    scheduler = st.session_state[key]
+    scheduler.target_fps = st.session_state.get('animation_fps', DEFAULT_FPS)
+    return scheduler
+
+
+def speed_control():
+    """
+    Frame rate slider, changing it reruns the page and the animation
+    carries on from the current date at the new speed
+    """
+    st.sidebar.slider("Speed (days/s)", 1, MAX_FPS, DEFAULT_FPS, key='animation_fps')
+
+
+def display_scheduler_stats(scheduler, container):
+    """
+    Shows and logs the achieved frame rate
+    """
+    stats = scheduler.stats()
+    container.caption(f"{stats['achieved_fps']:.1f}/{stats['target_fps']} fps, "
+                      f"{stats['dropped']} dropped, {stats['mean_frame_seconds'] * 1000:.0f} ms/frame")
+    LOGGER.debug("Animation stats: %s", stats)
+
+
+def animate(name, running, advance, draw, page=None):
+    """
+    Plays an animation from a fragment that Streamlit reruns on a timer
+    while running. Each run is one short frame: advance(days) moves the
+    animation on and returns False once there is nothing left to show,
+    then draw() renders the frame inside the fragment. Nothing loops or
+    sleeps on the script thread between frames, so pause, reset and the
+    other widgets take effect straight away
+    """
+    scheduler = get_scheduler(name)
+    if running:
+        scheduler.start()
+
+    @st.fragment(run_every=scheduler.interval if running else None)
+    def frame():
+        if not running:
+            draw()
+            return
+        days = scheduler.begin_frame()
+        with profiling.record(page or name, 'tick'):
+            if not advance(days):
+                # past the last frame, a full rerun stops the timer
+                st.rerun()
+            draw()
+        scheduler.end_frame()
+        display_scheduler_stats(scheduler, st)
+
+    frame()
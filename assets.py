@@ -0,0 +1,63 @@
+import io
+import os
+
+import streamlit as st
+from streamlit.logger import get_logger
+
+LOGGER = get_logger(__name__)
+
+# set BONI_WRITE_THUMBNAILS=1 to keep resized images on disk between restarts
+WRITE_THUMBNAILS = os.environ.get('BONI_WRITE_THUMBNAILS') == '1'
+THUMBNAIL_DIR = os.path.join('Images', 'thumbnails')
+
+
+def thumbnail_path(path, size):
+    """
+    Images/Ben.png at 720x720 -> Images/thumbnails/Ben_720x720.png
+    """
+    name, ext = os.path.splitext(os.path.basename(path))
+    return os.path.join(THUMBNAIL_DIR, f'{name}_{size[0]}x{size[1]}{ext}')
+
+
+def _target_size(image, size, scale):
+    if size is not None:
+        return tuple(size)
+    return int(image.size[0] * scale), int(image.size[1] * scale)
+
+
+@st.cache_resource(show_spinner=False, max_entries=32)
+def _resized_png(path, size, scale, mtime_ns, write_thumbnail):
+    """
+    Decodes, resizes and re-encodes path once per target size and file
+    version. The least recently used sizes are evicted past max_entries
+    """
+    from PIL import Image
+
+    with Image.open(path) as image:
+        size = _target_size(image, size, scale)
+        disk_path = thumbnail_path(path, size)
+        if os.path.exists(disk_path) and os.stat(disk_path).st_mtime_ns >= mtime_ns:
+            with open(disk_path, 'rb') as f:
+                return f.read()
+
+        buffer = io.BytesIO()
+        image.resize(size).save(buffer, format='PNG')
+    data = buffer.getvalue()
+
+    if write_thumbnail:
+        try:
+            os.makedirs(THUMBNAIL_DIR, exist_ok=True)
+            with open(disk_path, 'wb') as f:
+                f.write(data)
+        except OSError as e:
+            LOGGER.warning("Could not write thumbnail %s: %s", disk_path, e)
+    return data
+
+
+def image_bytes(path, size=None, scale=1.0):
+    """
+    PNG bytes of path resized to size (width, height) or by scale,
+    ready for st.image
+    """
+    return _resized_png(path, tuple(size) if size is not None else None, scale,
+                        os.stat(path).st_mtime_ns, WRITE_THUMBNAILS)
@@ -0,0 +1,268 @@
+"""
+Drives the pages headlessly with N concurrent sessions in one process,
+as one replica would serve them, and reports rerun latency percentiles,
+CPU use and memory per session
+
+    python -m benchmarks.load                          # 5 and 15 sessions over every page
+    python -m benchmarks.load --sessions 8 32 --pages pages/3_Horse_Race.py
+    python -m benchmarks.load --years 4                # on a synthetic log of 4 years
+
+Each session loads its page, then repeats its actions: switching member
+through the member select box, switching the Journey between Browser and
+Server animation, toggling Run / Pause and plain reruns, whichever the
+page has. While an animation is running most actions are
+ticks instead, reported apart from the other reruns. Results go to
+benchmarks/results/load-<commit>.json
+
+AppTest never fires st.fragment(run_every=...) timers, so a tick here is
+an explicit rerun of the whole page with Run on. That advances the
+animation one frame like the timer does, but also reruns the parts of
+the page outside the animation fragment, so tick latencies are an upper
+bound on a browser's timed ticks
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import numpy as np
+from streamlit.logger import set_log_level
+
+# the data loader is imported later, once BONI_DATA_PATH is set
+from profiling import PAGES
+
+MEMBERS = ('Ben', 'Oskar', 'Tonda')
+RUN_LABEL = "Run / Pause"
+RENDER_MODE_KEY = 'journey_render_mode'
+PERCENTILES = (50, 95, 99)
+# share of actions that are ticks while an animation runs, the timer fires far more often than viewers click
+TICK_SHARE = 0.8
+
+
+def rss_bytes():
+    """
+    Resident memory of this process, peak resident memory where /proc is missing
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on linux, bytes on macOS
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def page_actions(app):
+    """
+    The actions a session can take on the page as it is rendered now
+    """
+    actions = ['rerun']
+    if any(box.key == 'selected_member' for box in app.selectbox):
+        actions.append('switch member')
+    if any(radio.key == RENDER_MODE_KEY for radio in app.radio):
+        actions.append('switch animation')
+    if any(box.label == RUN_LABEL for box in app.checkbox):
+        actions.append('toggle run')
+    return actions
+
+
+def animation_running(app):
+    return any(box.label == RUN_LABEL and box.value for box in app.checkbox)
+
+
+def next_action(app, rng):
+    """
+    A tick most of the time while the page's animation runs, otherwise any of its actions
+    """
+    if animation_running(app) and rng.random() < TICK_SHARE:
+        return 'tick'
+    return rng.choice(page_actions(app))
+
+
+def act(app, action, rng):
+    """
+    Applies action to the page and reruns it. A tick is a plain
+    rerun standing in for the animation's timer
+    """
+    if action == 'switch member':
+        box = app.selectbox(key='selected_member')
+        box.set_value(rng.choice([member for member in box.options if member != box.value]))
+    elif action == 'switch animation':
+        radio = app.radio(key=RENDER_MODE_KEY)
+        radio.set_value(next(mode for mode in radio.options if mode != radio.value))
+    elif action == 'toggle run':
+        box = next(box for box in app.checkbox if box.label == RUN_LABEL)
+        box.set_value(not box.value)
+    app.run()
+
+
+class Session(threading.Thread):
+    """
+    One simulated viewer driving one page, recording the latency of
+    every rerun it triggers. Waits on start_gate so all sessions of a
+    run load their pages at the same time
+    """
+
+    def __init__(self, page, actions, start_gate, seed, timeout):
+        super().__init__(name=f'load-{os.path.basename(page)}-{seed}', daemon=True)
+        self.page = page
+        self.n_actions = actions
+        self.start_gate = start_gate
+        self.rng = random.Random(seed)
+        self.timeout = timeout
+        self.latencies = defaultdict(list)
+        self.errors = []
+        self.app = None
+
+    def timed(self, action, func):
+        start = time.perf_counter()
+        try:
+            func()
+        except Exception as e:
+            self.errors.append(f'{action}: {type(e).__name__}: {e}')
+            return False
+        self.latencies[action].append(time.perf_counter() - start)
+        if self.app.exception:
+            self.errors.extend(f'{action}: {exception.value}' for exception in self.app.exception)
+            return False
+        return True
+
+    def run(self):
+        from streamlit.testing.v1 import AppTest
+        self.app = AppTest.from_file(os.path.join(ROOT, self.page), default_timeout=self.timeout)
+        self.start_gate.wait()
+        if not self.timed('load', self.app.run):
+            return
+        for _ in range(self.n_actions):
+            action = next_action(self.app, self.rng)
+            if not self.timed(action, lambda: act(self.app, action, self.rng)):
+                return
+
+
+def percentiles(values):
+    if not values:
+        return {f'p{p}_ms': None for p in PERCENTILES}
+    return {f'p{p}_ms': float(np.percentile(values, p)) * 1000 for p in PERCENTILES}
+
+
+def run_level(pages, n_sessions, actions, timeout, seed=0):
+    """
+    Runs n_sessions concurrent sessions spread over pages and
+    returns one result per page plus the process totals
+    """
+    gate = threading.Barrier(n_sessions)
+    sessions = [Session(pages[i % len(pages)], actions, gate, seed + i, timeout) for i in range(n_sessions)]
+    rss_before = rss_bytes()
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    for session in sessions:
+        session.start()
+    for session in sessions:
+        session.join()
+    cpu_seconds, wall_seconds = time.process_time() - cpu_start, time.perf_counter() - wall_start
+    # measured while every session's state is still alive
+    rss_after = rss_bytes()
+
+    results = []
+    for page in pages:
+        page_sessions = [session for session in sessions if session.page == page]
+        latencies = defaultdict(list)
+        for session in page_sessions:
+            for action, values in session.latencies.items():
+                latencies[action].extend(values)
+        reruns = [value for action, values in latencies.items() if action not in ('load', 'tick') for value in values]
+        result = {'page': page, 'sessions': n_sessions, 'page_sessions': len(page_sessions),
+                  'reruns': len(reruns), 'ticks': len(latencies.get('tick', [])),
+                  'errors': sum(len(session.errors) for session in page_sessions)}
+        result.update(percentiles(reruns))
+        result.update({f'tick_{name}': value for name, value in percentiles(latencies.get('tick', [])).items()})
+        result['load_p50_ms'] = percentiles(latencies['load'])['p50_ms']
+        result['actions'] = {action: dict(percentiles(values), count=len(values))
+                             for action, values in latencies.items()}
+        result['first_errors'] = [error for session in page_sessions for error in session.errors][:3]
+        results.append(result)
+
+    totals = {'sessions': n_sessions, 'wall_seconds': wall_seconds, 'cpu_seconds': cpu_seconds,
+              'cpu_cores': cpu_seconds / wall_seconds if wall_seconds else 0.0,
+              'rss_bytes': rss_after,
+              'memory_per_session_bytes': max(rss_after - rss_before, 0) / n_sessions}
+    return results, totals
+
+
+def warm(pages, timeout):
+    """
+    One unmeasured run of each page, so the levels measure
+    serving sessions rather than the first load of the data
+    """
+    from streamlit.testing.v1 import AppTest
+    import warmup
+    for page in pages:
+        AppTest.from_file(os.path.join(ROOT, page), default_timeout=timeout).run()
+    while warmup.warmup_status()['state'] == 'warming':
+        time.sleep(0.1)
+
+
+def print_level(results, totals):
+    print(f"{totals['sessions']} sessions: {totals['cpu_cores']:.2f} cores busy, "
+          f"{totals['rss_bytes'] / 2**20:.0f} MiB resident, "
+          f"{totals['memory_per_session_bytes'] / 2**20:.2f} MiB per session")
+    for result in results:
+        p50, p95, p99 = (result[f'p{p}_ms'] for p in PERCENTILES)
+        if p50 is None:
+            print(f"  {result['page']:<26} no reruns, {result['errors']} errors {result['first_errors'][:1]}")
+        else:
+            print(f"  {result['page']:<26} {result['reruns']:>5} reruns  p50 {p50:8.1f} ms  p95 {p95:8.1f} ms  "
+                  f"p99 {p99:8.1f} ms  {result['errors']} errors")
+        if result['ticks']:
+            p50, p95, p99 = (result[f'tick_p{p}_ms'] for p in PERCENTILES)
+            print(f"  {'':<26} {result['ticks']:>5} ticks   p50 {p50:8.1f} ms  p95 {p95:8.1f} ms  p99 {p99:8.1f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the pages with concurrent headless sessions")
+    parser.add_argument('--sessions', type=int, nargs='+', default=[5, 15],
+                        help="concurrent sessions per run, spread over the pages")
+    parser.add_argument('--pages', nargs='+', default=PAGES, help="page scripts, sessions are spread over them")
+    parser.add_argument('--actions', type=int, default=10, help="actions per session after loading its page")
+    parser.add_argument('--years', type=float, help="use a synthetic log of this many years instead of the data file")
+    parser.add_argument('--restaurants', type=int, default=40)
+    parser.add_argument('--timeout', type=float, default=120, help="seconds a single rerun may take")
+    parser.add_argument('--cold', action='store_true', help="don't warm the pages up before measuring")
+    parser.add_argument('--output', help="results file, default benchmarks/results/load-<commit>.json")
+    args = parser.parse_args(argv)
+    os.chdir(ROOT)
+    # every headless session warns about the missing browser runtime
+    set_log_level('error')
+
+    if args.years:
+        path = os.path.join(tempfile.mkdtemp(prefix='boni-load-'), 'meals.csv')
+        os.environ['BONI_DATA_PATH'] = path
+        from benchmarks.synthetic import write_synthetic_csv
+        rows = write_synthetic_csv(path, member_names=MEMBERS, restaurants=args.restaurants, years=args.years)
+        print(f"Synthetic log of {rows} meals in {path}")
+
+    if not args.cold:
+        warm(args.pages, args.timeout)
+
+    from benchmarks.run import git_commit, write_results
+    levels = []
+    for n_sessions in args.sessions:
+        results, totals = run_level(args.pages, n_sessions, args.actions, args.timeout)
+        print_level(results, totals)
+        levels.append({'totals': totals, 'pages': results})
+
+    path = args.output or os.path.join(ROOT, 'benchmarks', 'results', f'load-{git_commit()}.json')
+    print("Results written to", write_results(levels, path))
+    return 1 if any(result['errors'] for level in levels for result in level['pages']) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,310 @@
+"""
+Times the data transformations behind each page on synthetic data of
+growing size and writes the results to benchmarks/results/<commit>.json
+
+    python -m benchmarks.run                      # default scaling grid
+    python -m benchmarks.run --years 1 4 --members 3 20 --only streaks
+    python -m benchmarks.run --compare benchmarks/results/abc1234.json benchmarks/results/def5678.json
+"""
+import argparse
+import datetime
+import functools
+import inspect
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import synthetic_dataset
+from business_days import monthly_utilisation
+from cumulative_visits import build_visit_events
+import dashboard
+from data_loader import MemberIndex, sort_meals
+from aggregates import MealAggregates
+from density import price_density
+from journey_animation import build_journey_animation
+from leaderboard import get_leaderboard
+import sql_backend
+from rollups import build_rollups
+from streaks import get_streaks
+
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+
+# name -> function(dataset) returning the zero argument callable to time
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    """
+    Registers a benchmark. The decorated function does any setup
+    and returns the callable that is timed
+    """
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+
+def _uncached(func):
+    # st.cache_* and the shared cache keep the function they wrap as __wrapped__
+    return inspect.unwrap(func)
+
+
+def _first_member(dataset):
+    return next(iter(dataset['member_index'].slices))
+
+
+@benchmark('load.sort_and_index')
+def bench_sort_and_index(dataset):
+    shuffled = dataset['df'].sample(frac=1, random_state=0)
+    return lambda: MemberIndex(sort_meals(shuffled))
+
+
+@benchmark('load.aggregates')
+def bench_aggregates(dataset):
+    return lambda: MealAggregates().update(dataset['df'])
+
+
+def _member_visits(dataset):
+    events = _uncached(build_visit_events)(dataset['aggregates'], dataset['version'])
+    return events.member(_first_member(dataset))
+
+
+@benchmark('cumulative_visits.member_table')
+def bench_member_table(dataset):
+    visits = _member_visits(dataset)
+    return visits.table
+
+
+@benchmark('cumulative_visits.member_days')
+def bench_member_days(dataset):
+    visits = _member_visits(dataset)
+    return lambda: [visits.day(date) for date in visits.dates()]
+
+
+def _rollups(dataset):
+    return _uncached(build_rollups)(dataset['version'], dataset['df'])
+
+
+@benchmark('rollups.build')
+def bench_rollups(dataset):
+    return lambda: _rollups(dataset)
+
+
+@benchmark('rollups.frame_summaries')
+def bench_frame_summaries(dataset):
+    rollups = _rollups(dataset)
+    member = _first_member(dataset)
+    dates = _member_visits(dataset).dates()
+    return lambda: [(rollups.spend(member, end=date), rollups.unique(member, end=date)) for date in dates]
+
+
+@benchmark('journey.browser_animation')
+def bench_journey_animation(dataset):
+    member = _first_member(dataset)
+    rollups = _rollups(dataset)
+    visits = _member_visits(dataset)
+    build = _uncached(build_journey_animation)
+    return lambda: build(member, dataset['version'], rollups, visits)
+
+
+@benchmark('dashboard.member')
+def bench_dashboard_member(dataset):
+    member = _first_member(dataset)
+
+    def run():
+        df = dashboard.select_member_df(dataset['df'], dataset['member_index'], member)
+        streak = _uncached(get_streaks)(dataset['version'], dataset['df'])['summary'].loc[member]
+        utilisation = monthly_utilisation(dataset['aggregates'].monthly_table())
+        monthly = utilisation[utilisation['Member'] == member].set_index('month').sort_index()
+        return (dashboard.get_restaurant_counts(df), dashboard.get_summary(df, streak),
+                dashboard.prepare_boni_cost_data(monthly), dashboard.prepare_boni_utilisation_data(monthly))
+    return run
+
+
+@benchmark('dashboard.monthly_utilisation')
+def bench_monthly_utilisation(dataset):
+    return lambda: monthly_utilisation(dataset['aggregates'].monthly_table())
+
+
+@benchmark('streaks')
+def bench_streaks(dataset):
+    return lambda: _uncached(get_streaks)(dataset['version'], dataset['df'])
+
+
+@benchmark('comparison.leaderboard')
+def bench_leaderboard(dataset):
+    return lambda: _uncached(get_leaderboard)(dataset['version'], dataset['df'])
+
+
+@benchmark('comparison.price_density')
+def bench_price_density(dataset):
+    return lambda: _uncached(price_density)(dataset['version'], dataset['df'])
+
+
+@benchmark('cumulative_visits.events')
+def bench_visit_events(dataset):
+    return lambda: _uncached(build_visit_events)(dataset['aggregates'], dataset['version'])
+
+
+@benchmark('horse_race.all_frames')
+def bench_race_frames(dataset):
+    events = _uncached(build_visit_events)(dataset['aggregates'], dataset['version'])
+    return lambda: [events.frame(date) for date in events.dates()]
+
+
+def _meal_database(dataset):
+    # one database file per dataset in a temporary directory, removed at exit
+    engine = sql_backend.available_engine()
+    path = os.path.join(_temp_dir().name, dataset['version'] + sql_backend.DB_SUFFIXES[engine])
+    db = sql_backend.MealDatabase(path, engine)
+    if db.version() != dataset['version']:
+        db.write(dataset['df'], dataset['version'])
+    return db
+
+
+@functools.lru_cache(maxsize=None)
+def _temp_dir():
+    return tempfile.TemporaryDirectory(prefix='boni-bench-')
+
+
+@benchmark('sql.write')
+def bench_sql_write(dataset):
+    db = _meal_database(dataset)
+    # a new version each time, the same one is already written and skipped
+    versions = itertools.count()
+    return lambda: db.write(dataset['df'], f"{dataset['version']}-{next(versions)}")
+
+
+@benchmark('sql.leaderboard_pairs')
+def bench_sql_pairs(dataset):
+    db = _meal_database(dataset)
+    return lambda: sql_backend.member_restaurant_totals(db)
+
+
+@benchmark('sql.member_month')
+def bench_sql_member_month(dataset):
+    db = _meal_database(dataset)
+    member = _first_member(dataset)
+    end = dataset['df']['date'].max()
+    return lambda: sql_backend.daily_visits(db, members=[member], start=end - pd.Timedelta(days=30), end=end)
+
+
+def measure(func, repeat):
+    """
+    Best and median wall time over repeat runs, and peak memory
+    allocated by one more run under tracemalloc
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'min_seconds': min(times), 'median_seconds': float(np.median(times)), 'peak_bytes': peak}
+
+
+def run_benchmarks(members, restaurants, years, names=None, repeat=5, seed=0):
+    """
+    Runs every selected benchmark on each (members, restaurants, years)
+    combination - one scaling curve per benchmark
+    """
+    names = names or list(BENCHMARKS)
+    results = []
+    for n_members, n_restaurants, n_years in itertools.product(members, restaurants, years):
+        dataset = synthetic_dataset(members=n_members, restaurants=n_restaurants, years=n_years, seed=seed)
+        for name in names:
+            func = BENCHMARKS[name](dataset)
+            result = {'benchmark': name, 'members': n_members, 'restaurants': n_restaurants,
+                      'years': n_years, 'rows': len(dataset['df'])}
+            result.update(measure(func, repeat))
+            results.append(result)
+            print(f"{name:<30} {n_members:>4} members {n_restaurants:>4} restaurants {n_years:>3} years "
+                  f"{result['median_seconds'] * 1000:>10.2f} ms {result['peak_bytes'] / 2**20:>8.2f} MiB")
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def write_results(results, path=None):
+    commit = git_commit()
+    path = path or os.path.join(RESULTS_DIR, f'{commit}.json')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({
+            'commit': commit,
+            'created': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'results': results,
+        }, f, indent=1)
+    return path
+
+
+def compare(old_path, new_path, threshold=1.2):
+    """
+    Prints the median time ratio of each benchmark present in both
+    files, flagging the ones slower than threshold. Returns the regressions
+    """
+    def keyed(path):
+        with open(path) as f:
+            return {(r['benchmark'], r['members'], r['restaurants'], r['years']): r for r in json.load(f)['results']}
+
+    old, new = keyed(old_path), keyed(new_path)
+    regressions = []
+    for key in sorted(old.keys() & new.keys()):
+        ratio = new[key]['median_seconds'] / old[key]['median_seconds']
+        flag = 'SLOWER' if ratio > threshold else ''
+        if flag:
+            regressions.append(key)
+        print(f"{key[0]:<30} {key[1]:>4} {key[2]:>4} {key[3]:>3}  x{ratio:5.2f} {flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the page data transformations on synthetic data")
+    parser.add_argument('--members', type=int, nargs='+', default=[3, 30])
+    parser.add_argument('--restaurants', type=int, nargs='+', default=[40])
+    parser.add_argument('--years', type=int, nargs='+', default=[1, 4])
+    parser.add_argument('--only', nargs='+', choices=sorted(BENCHMARKS), help="benchmarks to run, default all")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help="results file, default benchmarks/results/<commit>.json")
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help="compare two results files instead")
+    parser.add_argument('--threshold', type=float, default=1.2)
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        return 1 if compare(*args.compare, threshold=args.threshold) else 0
+
+    results = run_benchmarks(args.members, args.restaurants, args.years, args.only, args.repeat)
+    print("Results written to", write_results(results, args.output))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,80 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from aggregates import MealAggregates
+from data_loader import MemberIndex, sort_meals
+from storage import MEAL_DTYPES
+
+COLUMNS = ['date', 'time', 'restaurant', 'discount_meal_price', 'Member']
+
+
+def synthetic_meals(members=3, restaurants=40, years=1, meals_per_day=0.8, start='2023-10-02', seed=0,
+                    member_names=None):
+    """
+    A frame shaped like data/combined_data2.csv once loaded - same
+    columns and dtypes, sorted by Member then date. Each member eats on
+    about meals_per_day of the days, mostly on weekdays, at restaurants
+    picked with a long tail of popularity like the real log.
+    member_names replaces the generated names and sets the member count
+    """
+    if member_names is None:
+        member_names = [f'Member {i:03d}' for i in range(members)]
+    member_names = np.array(member_names)
+    members = len(member_names)
+    rng = np.random.default_rng(seed)
+    days = pd.date_range(start, periods=int(365 * years), freq='D')
+    weekday = days.dayofweek < 5
+    day_weights = np.where(weekday, 1.0, 0.15)
+    day_weights /= day_weights.sum()
+
+    names = np.array([f'Restaurant {i:04d}' for i in range(restaurants)])
+    popularity = 1.0 / np.arange(1, restaurants + 1)
+    popularity /= popularity.sum()
+    base_price = rng.uniform(0, 6, restaurants).round(1)
+
+    n_per_member = rng.poisson(meals_per_day * len(days), members)
+    n = int(n_per_member.sum())
+
+    restaurant_codes = rng.choice(restaurants, n, p=popularity)
+    price = np.clip(base_price[restaurant_codes] + rng.normal(0, 0.3, n), 0, None).round(2)
+    price[rng.random(n) < 0.05] = 0.0
+    minutes = rng.integers(11 * 60, 21 * 60, n)
+    time = pd.array([f'{m // 60:02d}:{m % 60:02d}' for m in minutes], dtype=MEAL_DTYPES['time'])
+    # the real log has meals without a time and the odd one without a price
+    time[rng.random(n) < 0.02] = pd.NA
+    price[rng.random(n) < 0.001] = np.nan
+
+    df = pd.DataFrame({
+        'date': days[rng.choice(len(days), n, p=day_weights)],
+        'time': time,
+        'restaurant': pd.Categorical(names[restaurant_codes]),
+        'discount_meal_price': price.astype(MEAL_DTYPES['discount_meal_price']),
+        'Member': pd.Categorical(np.repeat(member_names, n_per_member)),
+    }, columns=COLUMNS)
+    return sort_meals(df)
+
+
+def synthetic_dataset(**kwargs):
+    """
+    The same entry load_dataset() shares between sessions, built
+    from synthetic meals instead of the data file
+    """
+    df = synthetic_meals(**kwargs)
+    key = repr(sorted(kwargs.items())).encode()
+    return {
+        'version': 'synthetic-' + hashlib.blake2b(key, digest_size=8).hexdigest(),
+        'df': df,
+        'member_index': MemberIndex(df),
+        'aggregates': MealAggregates().update(df),
+    }
+
+
+def write_synthetic_csv(path, **kwargs):
+    """
+    Writes synthetic meals in the data file's format, for pointing the app at
+    """
+    df = synthetic_meals(**kwargs)
+    df.to_csv(path, index=False, date_format='%Y-%m-%d')
+    return len(df)
@@ -0,0 +1,122 @@
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+from dateutil.easter import easter
+
+import shared_cache
+import sql_backend
+
+DEFAULT_HOLIDAYS = 'SI'
+
+# name -> function(year) returning that year's public holidays
+HOLIDAY_TABLES = {}
+
+
+def holiday_table(name):
+    """
+    Registers a function returning a year's public holidays
+    """
+    def register(func):
+        HOLIDAY_TABLES[name] = func
+        return func
+    return register
+
+
+@holiday_table('SI')
+def slovenian_holidays(year):
+    """
+    Slovenian public holidays that close the university / Boni scheme.
+    Easter Sunday and Whit Sunday always fall on a weekend
+    """
+    fixed = [(1, 1), (1, 2), (2, 8), (4, 27), (5, 1), (5, 2), (6, 25),
+             (8, 15), (10, 31), (11, 1), (12, 25), (12, 26)]
+    holidays = [pd.Timestamp(year, month, day) for month, day in fixed]
+    holidays.append(pd.Timestamp(easter(year)) + pd.Timedelta(days=1))  # Easter Monday
+    return holidays
+
+
+@holiday_table('none')
+def no_holidays(year):
+    return []
+
+
+@lru_cache(maxsize=16)
+def business_day_calendar(holidays, first_year, last_year):
+    """
+    numpy business day calendar - Monday to Friday less the holiday
+    table - built once per holiday table and range of years
+    """
+    dates = [day for year in range(first_year, last_year + 1) for day in HOLIDAY_TABLES[holidays](year)]
+    return np.busdaycalendar(weekmask='1111100', holidays=np.array(dates, dtype='datetime64[D]'))
+
+
+def business_days_between(starts, ends, holidays=DEFAULT_HOLIDAYS):
+    """
+    Vectorised count of business days in [start, end) for each pair
+    """
+    starts = np.asarray(starts, dtype='datetime64[D]')
+    ends = np.asarray(ends, dtype='datetime64[D]')
+    if starts.size == 0:
+        return np.zeros(0, dtype=int)
+    years = np.concatenate([starts, ends]).astype('datetime64[Y]').astype(int) + 1970
+    calendar = business_day_calendar(holidays, int(years.min()), int(years.max()))
+    return np.busday_count(starts, ends, busdaycal=calendar)
+
+
+def working_days_per_month(months, holidays=DEFAULT_HOLIDAYS):
+    """
+    Business days in each month of a PeriodIndex (or array of monthly periods)
+    """
+    months = pd.PeriodIndex(months, freq='M')
+    return business_days_between(months.start_time, (months + 1).start_time, holidays)
+
+
+def monthly_utilisation(monthly, holidays=DEFAULT_HOLIDAYS):
+    """
+    Takes a long (Member, month, Used) table for any number of members
+    and months and adds working_days and Unused - one calendar lookup
+    for the distinct months joined back onto every row
+    """
+    months = pd.PeriodIndex(monthly['month'].unique(), freq='M')
+    working_days = pd.Series(working_days_per_month(months, holidays), index=months, name='working_days')
+    df = monthly.join(working_days, on='month')
+    df['Unused'] = (df['working_days'] - df['Used']).clip(lower=0)
+    return df
+
+
+def queried_monthly_totals(db, members=None):
+    """
+    monthly_totals from the SQL backend in the aggregates' table format
+    """
+    monthly = sql_backend.monthly_totals(db, members=members).to_pandas()
+    monthly['month'] = pd.PeriodIndex(monthly['month'], freq='M')
+    return monthly
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
+@shared_cache.shared_result
+def get_monthly_utilisation(data_version, _aggregates):
+    """
+    Used and Unused vouchers for every member and month,
+    joined with the working day calendar in one go
+    """
+    db = sql_backend.meal_database(data_version)
+    if db is not None:
+        monthly = queried_monthly_totals(db)
+    else:
+        monthly = _aggregates.monthly_table()
+    return monthly_utilisation(monthly)
+
+
+def member_monthly_utilisation(member, data_version, _aggregates):
+    """
+    member's rows of get_monthly_utilisation. With the SQL backend only
+    member's meals are read, through the (Member, date) index
+    """
+    db = sql_backend.meal_database(data_version)
+    if db is not None:
+        return monthly_utilisation(queried_monthly_totals(db, members=[member]))
+    utilisation = get_monthly_utilisation(data_version, _aggregates)
+    return utilisation[utilisation['Member'] == member]
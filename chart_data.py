@@ -0,0 +1,52 @@
+"""
+Chart data sent to the browser as compact Arrow tables instead of
+embedded in the chart spec. Charts refer to their data by name, so one
+table can feed several charts drawn as a single element, and a rerun
+that draws the same chart produces the same message, which the browser
+already holds (see .streamlit/config.toml).
+"""
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+
+def compact_array(values):
+    """
+    One column in the smallest Arrow type that holds it: strings and
+    categories dictionary encoded, integers narrowed. Floats are kept
+    as they are, float32 would show its rounding noise in tooltips
+    """
+    if isinstance(values.dtype, pd.CategoricalDtype) or pd.api.types.is_string_dtype(values) \
+            or values.dtype == object:
+        return pa.array(values.astype('string'), pa.string()).dictionary_encode()
+    if pd.api.types.is_bool_dtype(values):
+        return pa.array(values, pa.bool_())
+    if pd.api.types.is_integer_dtype(values):
+        numbers = values.to_numpy()
+        if not len(numbers):
+            return pa.array(numbers.astype(np.int32))
+        dtype = np.result_type(np.min_scalar_type(int(numbers.min())), np.min_scalar_type(int(numbers.max())))
+        return pa.array(numbers.astype(dtype))
+    return pa.array(values)
+
+
+def compact_table(df):
+    """
+    df as an Arrow table of compact columns, without the index or pandas metadata
+    """
+    return pa.table({str(name): compact_array(df[name]) for name in df.columns})
+
+
+def chart_spec(chart, datasets):
+    """
+    The Vega-Lite spec of an Altair chart whose data are named -
+    alt.NamedData(name) - with datasets (name -> frame) attached as
+    Arrow tables. Each table goes once however many views use it
+    """
+    spec = chart.to_dict()
+    # the default theme's fixed view size, Streamlit drops it from its own charts too
+    spec.get('config', {}).pop('view', None)
+    if not spec.get('config'):
+        spec.pop('config', None)
+    spec['datasets'] = {name: compact_table(df) for name, df in datasets.items()}
+    return spec
@@ -0,0 +1,186 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+import shared_cache
+import sql_backend
+
+
+def small_uint(values):
+    """
+    values in the smallest unsigned integer dtype that holds them
+    """
+    values = np.asarray(values)
+    return values.astype(np.min_scalar_type(int(values.max()) if values.size else 0))
+
+
+class VisitEvents:
+    """
+    Cumulative restaurant visits of every member on one date axis shared
+    by every page, stored as change points: for each (member, restaurant)
+    pair only the days its total changes and the new total. Memory grows
+    with the number of visits rather than days x restaurants, and a day's
+    state is only materialised when it is asked for
+    """
+
+    def __init__(self, start_date, n_days, members, restaurants,
+                 pair_member, pair_restaurant, pair_offsets, event_day, event_total):
+        self.start_date = start_date
+        self.n_days = n_days
+        self.members = members
+        self.restaurants = restaurants
+        # pairs are ordered by member then restaurant, events by pair then day,
+        # so a member's pairs and a pair's events are contiguous
+        self.pair_member = pair_member
+        self.pair_restaurant = pair_restaurant
+        self.pair_offsets = pair_offsets
+        self.event_day = event_day
+        self.event_total = event_total
+        self.member_pairs = np.searchsorted(pair_member, np.arange(len(members) + 1))
+        self.member_codes = {member: code for code, member in enumerate(members)}
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in (self.pair_member, self.pair_restaurant, self.pair_offsets,
+                                              self.event_day, self.event_total))
+
+    def dates(self):
+        """
+        The common date axis
+        """
+        return pd.date_range(self.start_date, periods=self.n_days, freq='D')
+
+    def frame_index(self, date):
+        """
+        Position of date on the day axis,
+        -1 if date is before the first recorded day
+        """
+        offset = (pd.Timestamp(date).normalize() - self.start_date).days
+        if offset < 0:
+            return -1
+        return min(offset, self.n_days - 1)
+
+    def totals_on(self, day, first_pair, last_pair):
+        """
+        Cumulative visits on day of pairs [first_pair, last_pair) -
+        the total at each pair's last change on or before day
+        """
+        first_event, last_event = self.pair_offsets[first_pair], self.pair_offsets[last_pair]
+        if first_pair == last_pair or day < 0:
+            return np.zeros(last_pair - first_pair, dtype=self.event_total.dtype)
+        # days are sorted within a pair, so the events seen by day are a prefix of each pair's
+        seen = self.event_day[first_event:last_event] <= day
+        starts = self.pair_offsets[first_pair:last_pair] - first_event
+        n_seen = np.add.reduceat(seen, starts, dtype=np.intp)
+        last_seen = np.maximum(first_event + starts + n_seen - 1, 0)
+        return np.where(n_seen > 0, self.event_total[last_seen], 0).astype(self.event_total.dtype)
+
+    def frame(self, date):
+        """
+        Returns the long format (Member, Restaurant, Cumulative Visits)
+        rows with at least one visit up to and including date
+        """
+        totals = self.totals_on(self.frame_index(date), 0, len(self.pair_member))
+        visited = np.flatnonzero(totals)
+        return pd.DataFrame({
+            'Restaurant': self.restaurants[self.pair_restaurant[visited]],
+            'Cumulative Visits': totals[visited],
+            'Member': self.members[self.pair_member[visited]],
+        })
+
+    def member(self, member):
+        return MemberVisits(self, self.member_codes.get(member))
+
+
+class MemberVisits:
+    """
+    One member's pairs of VisitEvents, with restaurants
+    in name order like the pivot table they replace
+    """
+
+    def __init__(self, events, member_code):
+        self.events = events
+        if member_code is None:
+            self.first_pair = self.last_pair = 0
+        else:
+            self.first_pair, self.last_pair = events.member_pairs[member_code], events.member_pairs[member_code + 1]
+        restaurants = events.restaurants[events.pair_restaurant[self.first_pair:self.last_pair]]
+        self.order = np.argsort(restaurants, kind='stable')
+        self.restaurants = restaurants[self.order]
+
+    def dates(self):
+        return self.events.dates()
+
+    def day(self, date):
+        """
+        (Restaurant, Cumulative Visits) of restaurants visited up to and including date
+        """
+        totals = self.events.totals_on(self.events.frame_index(date), self.first_pair, self.last_pair)[self.order]
+        visited = np.flatnonzero(totals)
+        return pd.DataFrame({'Restaurant': self.restaurants[visited], 'Cumulative Visits': totals[visited]})
+
+    def table(self, end_date=None):
+        """
+        Wide (date, one column per restaurant) running totals from the first
+        day up to and including end_date, materialised on demand
+        """
+        events = self.events
+        n_days = events.n_days if end_date is None else events.frame_index(end_date) + 1
+        first_event, last_event = events.pair_offsets[self.first_pair], events.pair_offsets[self.last_pair]
+        totals = events.event_total[first_event:last_event]
+        days = events.event_day[first_event:last_event]
+        pair_sizes = np.diff(events.pair_offsets[self.first_pair:self.last_pair + 1])
+        local_pair = np.repeat(np.arange(len(pair_sizes)), pair_sizes)
+
+        # each change point adds the step from the pair's previous total
+        steps = totals.astype(np.intp)
+        steps[1:] -= totals[:-1]
+        steps[pair_sizes.cumsum()[:-1]] = totals[pair_sizes.cumsum()[:-1]]
+        shown = days < n_days
+
+        counts = np.zeros((n_days, len(pair_sizes)), dtype=totals.dtype)
+        counts[days[shown], local_pair[shown]] = steps[shown]
+        np.cumsum(counts, axis=0, out=counts)
+        df = pd.DataFrame(counts[:, self.order], columns=self.restaurants)
+        df.insert(0, 'date', events.dates()[:n_days])
+        return df
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+@shared_cache.shared_result
+def build_visit_events(_aggregates, data_version):
+    """
+    Turns the shared daily visit counts into each (member, restaurant)
+    pair's running total at the days it changes. The day axis runs from
+    the first to the last recorded meal of all members so every member
+    is padded to the same end date. Cached per data_version
+    """
+    db = sql_backend.meal_database(data_version)
+    if db is not None:
+        daily = sql_backend.daily_visits(db).to_pandas()
+        daily['date'] = pd.to_datetime(daily['date'])
+    else:
+        daily = _aggregates.all_daily_visits()
+    days = daily['date']
+    start_date = days.min()
+    n_days = (days.max() - start_date).days + 1
+
+    member_codes, members = pd.factorize(daily['Member'])
+    restaurant_codes, restaurants = pd.factorize(daily['restaurant'])
+    day_codes = (days - start_date).dt.days.to_numpy()
+    pair_codes = member_codes.astype(np.int64) * len(restaurants) + restaurant_codes
+
+    order = np.lexsort((day_codes, pair_codes))
+    pair_codes, day_codes = pair_codes[order], day_codes[order]
+    visits = daily['visits'].to_numpy()[order]
+    pairs, pair_starts = np.unique(pair_codes, return_index=True)
+    pair_offsets = np.r_[pair_starts, len(visits)].astype(np.int64)
+
+    # running total within each pair
+    running = np.cumsum(visits)
+    before_pair = running[pair_starts] - visits[pair_starts]
+    totals = running - np.repeat(before_pair, np.diff(pair_offsets))
+
+    return VisitEvents(start_date, n_days, np.asarray(members), np.asarray(restaurants),
+                       small_uint(pairs // len(restaurants)), small_uint(pairs % len(restaurants)),
+                       pair_offsets, small_uint(day_codes), small_uint(totals))
@@ -0,0 +1,122 @@
+"""
+The per member views of the Dashboard page. Kept out of the page
+so the background warm up can fill the same cache entries
+"""
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+import shared_cache
+from business_days import member_monthly_utilisation
+from streaks import get_streaks
+
+# members whose dashboards are kept, least recently used evicted first
+DASHBOARD_CACHE_ENTRIES = 32
+
+
+def select_member_df(df, member_index, member):
+    # the member index slices are already ordered by date
+    return member_index.rows(df, member)
+
+
+def boni_spend_per_month(monthly):
+    """
+    Takes a member's monthly aggregates and 
+    returns boni spend by month df 
+    """
+    # prices are stored as float32, round away the noise
+    df_by_month = monthly[['cost']].round(2)
+    return df_by_month
+
+
+def month_labels(months):
+    """
+    Month names, with the year once the data spans more than a year
+    """
+    months = pd.PeriodIndex(months, freq='M')
+    if len(months) and (months.max() - months.min()).n >= 12:
+        return months.strftime('%B %Y')
+    return months.strftime('%B')
+
+
+def boni_usage_per_month(monthly):
+    """
+    Takes a member's monthly aggregates and 
+    returns a df with Used and Unused vouchers
+    by month
+    """
+    df_by_month = monthly[['Used', 'Unused']].copy()
+
+    # Extract month names
+    df_by_month['month_name'] = month_labels(df_by_month.index)
+
+    # convert to long format
+    df_by_month = pd.melt(df_by_month, id_vars=['month_name'], var_name='Utilisation')
+
+    return df_by_month
+
+
+# get Boni summary stats functions
+def get_top_boni(df):
+    """
+    Returns the most visited restaurant
+    """
+    top_restaurant = df['restaurant'].value_counts().idxmax()
+    return top_restaurant
+
+
+def get_restaurant_counts(df):
+    """Prepares restaurant visit count data."""
+    restaurant_counts = df['restaurant'].value_counts().reset_index()
+    restaurant_counts.columns = ['Restaurant', 'Count']
+    # restaurant is categorical - drop restaurants only other members visited
+    return restaurant_counts[restaurant_counts['Count'] > 0]
+
+
+def get_summary(df, streak):
+    """Computes key summary metrics for Boni trips."""
+    return {
+        'top_boni': get_top_boni(df),
+        'total_trips': df.shape[0],
+        'unique_boni': len(df['restaurant'].unique()),
+        'avg_meal_price': round(float(df['discount_meal_price'].mean()), 2),
+        'longest_streak': int(streak['longest']),
+        'current_streak': int(streak['current']),
+    }
+
+
+def prepare_boni_cost_data(monthly):
+    """Processes Boni spend per month data."""
+    df_by_month = boni_spend_per_month(monthly)
+    df_by_month['Budget Status'] = np.where(df_by_month['cost'] > 50, 'Over-budget', 'Under-budget')
+    df_by_month['month_name'] = month_labels(df_by_month.index)
+    return df_by_month
+
+
+def prepare_boni_utilisation_data(monthly):
+    """Processes Boni utilisation per month data."""
+    boni_usage_by_month = boni_usage_per_month(monthly)
+    return boni_usage_by_month
+
+
+@st.cache_data(show_spinner=False, max_entries=DASHBOARD_CACHE_ENTRIES)
+@shared_cache.shared_result
+def get_dashboard_aggregates(member, data_version, _df, _member_index, _aggregates):
+    """
+    Everything the dashboard shows for member, computed together.
+    Kept per (member, data version) so switching back to a member is
+    a lookup - the least recently used entries are evicted and a new
+    data version never hits an old entry. The warm up fills it for
+    the members with the most meals
+    """
+    df = select_member_df(_df, _member_index, member)
+    # streaks of every member come from one pass, cached per data version
+    streak = get_streaks(data_version, _df)['summary'].loc[member]
+    # monthly totals are kept up to date by the shared loader, or queried for member alone
+    monthly = member_monthly_utilisation(member, data_version, _aggregates).set_index('month').sort_index()
+    return {
+        'restaurant_counts': get_restaurant_counts(df),
+        'summary': get_summary(df, streak),
+        'cost_by_month': prepare_boni_cost_data(monthly),
+        'utilisation_by_month': prepare_boni_utilisation_data(monthly),
+    }
@@ -0,0 +1,235 @@
+import hashlib
+import io
+import os
+import threading
+import time
+
+import numpy as np
+from streamlit.logger import get_logger
+
+from aggregates import MealAggregates
+from storage import concat_meals, read_meals, read_meals_csv
+
+LOGGER = get_logger(__name__)
+
+# BONI_DATA_PATH points the app at another meal log, e.g. a synthetic one
+COMBINED_DATA_PATH = os.environ.get('BONI_DATA_PATH', 'data/combined_data2.csv')
+
+# one entry per data file, shared by every session in the process
+_loaded = {}
+_lock = threading.Lock()
+
+
+class MemberIndex:
+    """
+    Row ranges of each member in a frame sorted by Member then date,
+    so a member's meals are a contiguous, already date-sorted slice
+    """
+
+    def __init__(self, df):
+        members = df['Member'].to_numpy()
+        starts = np.flatnonzero(np.r_[True, members[1:] != members[:-1]]) if len(df) else np.array([], dtype=int)
+        stops = np.r_[starts[1:], len(df)]
+        self.slices = {members[start]: (start, stop) for start, stop in zip(starts, stops)}
+
+    @classmethod
+    def from_counts(cls, members, counts):
+        """
+        Index of a frame holding counts[i] rows of members[i], in that order
+        """
+        index = cls.__new__(cls)
+        stops = np.cumsum(counts, dtype=int)
+        index.slices = {member: (int(stop - count), int(stop)) for member, count, stop in zip(members, counts, stops)}
+        return index
+
+    def rows(self, df, member):
+        """
+        member's meals in date order - a slice of df, not a copy
+        """
+        start, stop = self.slices.get(member, (0, 0))
+        return df.iloc[start:stop]
+
+
+def sort_meals(df):
+    """
+    Orders meals by Member then date so MemberIndex slices are contiguous
+    """
+    return df.sort_values(by=['Member', 'date'], kind='stable', ignore_index=True)
+
+
+def insert_meals(df, member_index, new_rows):
+    """
+    Adds new_rows to df, sorted by Member then date, without sorting
+    the whole frame again: each new meal goes after its member's meals
+    on or before its date, members new to the log go at the end.
+    Returns the frame and its MemberIndex
+    """
+    combined = concat_meals(df, new_rows)
+    new = combined.iloc[len(df):]
+    # existing categories keep their codes, so members are still in code order
+    codes = new['Member'].cat.codes.to_numpy()
+    dates = new['date'].to_numpy()
+    new_order = np.lexsort((dates, codes))
+    codes, dates = codes[new_order], dates[new_order]
+    existing_dates = df['date'].to_numpy()
+
+    positions = np.full(len(new), len(df))
+    added = {}
+    member_codes, firsts = np.unique(codes, return_index=True)
+    names = new['Member'].cat.categories[member_codes]
+    for member, first, last in zip(names, firsts, np.r_[firsts[1:], len(codes)]):
+        added[member] = last - first
+        if member in member_index.slices:
+            start, stop = member_index.slices[member]
+            positions[first:last] = start + np.searchsorted(existing_dates[start:stop], dates[first:last], side='right')
+
+    order = np.insert(np.arange(len(df)), positions, len(df) + new_order)
+    old_members = sorted(member_index.slices, key=lambda member: member_index.slices[member][0])
+    new_members = [member for member in added if member not in member_index.slices]
+    counts = [member_index.slices[member][1] - member_index.slices[member][0] + added.get(member, 0)
+              for member in old_members] + [added[member] for member in new_members]
+    return (combined.take(order).reset_index(drop=True),
+            MemberIndex.from_counts(old_members + new_members, counts))
+
+
+def file_signature(path):
+    """
+    Cheap change check - modification time and size
+    """
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def content_hash(path, prefix_size=None, limit=None):
+    """
+    Short sha256 of the file contents, used as the data version.
+    Returns (version, size read, version of the first prefix_size bytes)
+    so an append can be told apart from a rewrite in the same pass.
+    limit hashes only the first limit bytes
+    """
+    digest = hashlib.sha256()
+    prefix_version = None
+    size = 0
+    with open(path, 'rb') as f:
+        if prefix_size is not None:
+            prefix = f.read(prefix_size)
+            digest.update(prefix)
+            size = len(prefix)
+            prefix_version = digest.hexdigest()[:16]
+        while limit is None or size < limit:
+            chunk = f.read(1 << 20 if limit is None else min(1 << 20, limit - size))
+            if not chunk:
+                break
+            digest.update(chunk)
+            size += len(chunk)
+    return digest.hexdigest()[:16], size, prefix_version
+
+
+def read_appended_rows(path, offset, columns):
+    """
+    Parses only the complete rows written after byte offset and returns
+    them with the offset they end at. A row still being written (no
+    final newline yet) is left for the next load
+    """
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        tail = f.read()
+    tail = tail[:tail.rfind(b'\n') + 1]
+    return read_meals_csv(io.BytesIO(tail), names=columns), offset + len(tail)
+
+
+def load_combined_df(path=COMBINED_DATA_PATH):
+    """
+    Returns (df, data_version) for path, df sorted by Member then date.
+    The file is read once per process, through its typed columnar
+    store, and the same frame is handed to every session - treat it
+    as read-only. It is re-read only when the mtime/size changes and
+    the content hash differs. If the file only grew (rows appended,
+    see ingest.py) just the new rows are parsed and added to the
+    frame and aggregates
+    """
+    dataset = load_dataset(path)
+    return dataset['df'], dataset['version']
+
+
+def load_dataset(path=COMBINED_DATA_PATH):
+    """
+    Same as load_combined_df but returns the whole shared entry -
+    df, version, member_index, aggregates and metrics - taken together
+    so they always belong to the same version
+    """
+    signature = file_signature(path)
+    entry = _loaded.get(path)
+    if entry is not None and entry['signature'] == signature:
+        return entry
+
+    with _lock:
+        # another session may have reloaded while we waited
+        entry = _loaded.get(path)
+        if entry is not None and entry['signature'] == signature:
+            return entry
+
+        hash_start = time.perf_counter()
+        version, size, prefix_version = content_hash(path, entry['size'] if entry is not None else None)
+        hash_seconds = time.perf_counter() - hash_start
+
+        if entry is not None and entry['version'] == version:
+            # touched but unchanged
+            entry['signature'] = signature
+            return entry
+
+        load_start = time.perf_counter()
+        appended = entry is not None and size > entry['size'] and prefix_version == entry['version']
+        if appended:
+            new_rows, complete_size = read_appended_rows(path, entry['size'], list(entry['df'].columns))
+            if complete_size < size:
+                # the version covers the complete rows only, so the next append continues from them
+                size = complete_size
+                version = content_hash(path, limit=size)[0]
+            if new_rows.empty:
+                # only part of a row so far
+                entry['signature'] = signature
+                return entry
+            df, member_index = insert_meals(entry['df'], entry['member_index'], new_rows)
+            # the previous version's entry keeps its own totals
+            aggregates = entry['aggregates'].copy().update(new_rows)
+        else:
+            df = sort_meals(read_meals(path, version))
+            member_index = MemberIndex(df)
+            aggregates = MealAggregates().update(df)
+        load_seconds = time.perf_counter() - load_start
+
+        metrics = {
+            'version': version,
+            'rows': len(df),
+            'appended_rows': len(new_rows) if appended else 0,
+            'load_seconds': load_seconds,
+            'hash_seconds': hash_seconds,
+            # an append adds the new rows' size rather than measuring every column again
+            'memory_bytes': (entry['metrics']['memory_bytes'] + int(new_rows.memory_usage(deep=True, index=False).sum())
+                             if appended else int(df.memory_usage(deep=True).sum())),
+            'loads': entry['metrics']['loads'] + 1 if entry is not None else 1,
+            'loaded_at': time.time(),
+        }
+        _loaded[path] = {'signature': signature, 'size': size, 'version': version,
+                         'df': df, 'member_index': member_index, 'aggregates': aggregates,
+                         'metrics': metrics,
+                         # what an append added to which version, so copies of the log can catch up
+                         'appended_to': entry['version'] if appended else None,
+                         'new_rows': new_rows if appended else None}
+        LOGGER.info("Loaded %s (version %s): %d rows (%d appended) in %.3fs, %.1f KB",
+                    path, version, metrics['rows'], metrics['appended_rows'], load_seconds,
+                    metrics['memory_bytes'] / 1024)
+
+        return _loaded[path]
+
+
+def get_load_metrics(path=COMBINED_DATA_PATH):
+    """
+    Load time and memory metrics of the currently shared frame,
+    None if path has not been loaded yet
+    """
+    entry = _loaded.get(path)
+    if entry is None:
+        return None
+    return dict(entry['metrics'])
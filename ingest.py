@@ -0,0 +1,96 @@
+"""
+Appends new meals to the combined meal log instead of regenerating it.
+
+    python ingest.py data/new_meals.csv --member Ben
+
+The input needs date, restaurant and discount_meal_price columns,
+time and Member are optional (--member fills a missing Member).
+Meals already in the log - same date, time, restaurant and Member -
+are skipped. Running apps only parse the appended rows, see
+data_loader.load_combined_df
+"""
+import argparse
+
+import pandas as pd
+
+from data_loader import COMBINED_DATA_PATH, load_combined_df
+
+COLUMNS = ['date', 'time', 'restaurant', 'discount_meal_price', 'Member']
+KEY_COLUMNS = ['date', 'time', 'restaurant', 'Member']
+
+
+def normalise_meals(rows, member=None):
+    """
+    Puts new rows into the combined log's column order and formats,
+    dropping repeats within the batch
+    """
+    rows = rows.copy()
+    if 'Member' not in rows.columns:
+        if member is None:
+            raise ValueError("rows have no Member column, pass member")
+        rows['Member'] = member
+    if 'time' not in rows.columns:
+        rows['time'] = ''
+    rows['date'] = pd.to_datetime(rows['date']).dt.normalize()
+    rows['time'] = rows['time'].fillna('').astype(str)
+    return rows[COLUMNS].drop_duplicates(subset=KEY_COLUMNS)
+
+
+def meal_keys(df):
+    """
+    Dedupe keys of df as a MultiIndex of strings, missing time as ''
+    """
+    return pd.MultiIndex.from_arrays([
+        df['date'].dt.strftime('%Y-%m-%d'),
+        df['time'].astype(object).fillna('').astype(str),
+        df['restaurant'].astype(str),
+        df['Member'].astype(str),
+    ])
+
+
+def line_terminator(path):
+    """
+    Line ending used by the file, and whether it is missing a final one
+    """
+    with open(path, 'rb') as f:
+        head = f.read(4096)
+        f.seek(max(f.seek(0, 2) - 1, 0))
+        last = f.read(1)
+    newline = '\r\n' if b'\r\n' in head else '\n'
+    return newline, last != b'\n'
+
+
+def append_meals(rows, member=None, path=COMBINED_DATA_PATH):
+    """
+    Appends the meals in rows that are not already in the log at path.
+    Only the new rows are written. Returns the rows appended
+    """
+    new_rows = normalise_meals(rows, member)
+    existing, _ = load_combined_df(path)
+    # only meals on the same dates can be duplicates
+    existing = existing[existing['date'].isin(new_rows['date'].unique())]
+    new_rows = new_rows[~meal_keys(new_rows).isin(meal_keys(existing))]
+    if new_rows.empty:
+        return new_rows
+
+    newline, needs_newline = line_terminator(path)
+    text = new_rows.to_csv(header=False, index=False, lineterminator=newline, date_format='%Y-%m-%d')
+    # one write, so a loading app sees few partial rows (it skips any it does see)
+    with open(path, 'a', newline='', encoding='utf-8') as f:
+        f.write(newline + text if needs_newline else text)
+    return new_rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Append new meals to the combined meal log")
+    parser.add_argument('csv', help="csv of new meals")
+    parser.add_argument('--member', help="Member for rows without a Member column")
+    parser.add_argument('--path', default=COMBINED_DATA_PATH, help="combined meal log to append to")
+    args = parser.parse_args()
+
+    appended = append_meals(pd.read_csv(args.csv), member=args.member, path=args.path)
+    print(f"Appended {len(appended)} meals to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+The Journey page's browser side animation, built once per member and
+data version. Kept out of the page so the background warm up can fill
+the same cache entries
+"""
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+
+VISIT_COLOURS = {
+    '1 visit' : 'skyblue',
+    '2 visits' : 'lightcoral',
+    '2+ visits': 'lightgreen'
+}
+
+
+def visit_frame_data(counts, restaurants):
+    """
+    Horizontal bar traces of one day's cumulative visits, one trace per
+    visit band, as plain dicts - frames are built once per day of the
+    journey, validating each as a plotly object would take seconds
+    """
+    visited = np.nonzero(counts)[0]
+    visited = visited[np.argsort(counts[visited], kind='stable')]
+    bands = np.where(counts[visited] == 1, '1 visit', np.where(counts[visited] == 2, '2 visits', '2+ visits'))
+    return [{'type': 'bar', 'x': counts[visited][bands == band], 'y': restaurants[visited][bands == band],
+             'orientation': 'h', 'name': band, 'marker': {'color': colour}, 'legendgroup': 'visits'}
+            for band, colour in VISIT_COLOURS.items()]
+
+
+@st.cache_resource(show_spinner=False, max_entries=16)
+def build_journey_animation(member, data_version, _rollups, _visits):
+    """
+    One figure holding the whole journey, sent to the browser once.
+    The stacked chart carries the full history and each frame only
+    moves its axis ranges, the bar chart frames carry that day's
+    visit counts - so a frame's size doesn't grow with history.
+    The figure is shared by every session showing it, not copied, so
+    it must not be changed
+    """
+    # only the browser animation needs plotly, keep it off the server path
+    import plotly.io as pio
+
+    table = _visits.table()
+    dates = table['date']
+    cumsum = table.drop(columns='date')
+    # order restaurants by total visits as the live chart does
+    cumsum = cumsum[cumsum.sum().sort_values(ascending=False).index]
+    restaurants = cumsum.columns.to_numpy()
+    counts = cumsum.to_numpy(dtype=np.int32)
+    stacked_heights = counts.sum(axis=1)
+    # spend and unique Boni before each date, as the summary row shows them
+    spend, unique = _rollups.spend(member, end=dates), _rollups.unique(member, end=dates)
+
+    day_strings = dates.dt.strftime('%Y-%m-%d').to_numpy()
+    data = [{'type': 'bar', 'x': day_strings, 'y': counts[:, i], 'name': restaurant, 'legendgroup': 'restaurants',
+             'xaxis': 'x', 'yaxis': 'y'}
+            for i, restaurant in enumerate(restaurants)]
+    first_day = len(restaurants)
+    data += [{**trace, 'xaxis': 'x2', 'yaxis': 'y2'} for trace in visit_frame_data(counts[0], restaurants)]
+
+    half_day = pd.Timedelta(hours=12)
+    first = dates.iloc[0] - half_day
+    frames = []
+    for i, (day, name) in enumerate(zip(dates, day_strings)):
+        frames.append({
+            'name': name,
+            'data': visit_frame_data(counts[i], restaurants),
+            'traces': list(range(first_day, first_day + len(VISIT_COLOURS))),
+            'layout': {
+                'title': {'text': f"Current Date: {name}   Total Spend: €{round(spend[i], 2)}   Tried {unique[i]} Boni"},
+                'xaxis': {'range': [first, day + half_day]},
+                'yaxis': {'range': [0, max(stacked_heights[i], 1) * 1.05]},
+            }})
+
+    play_args = {'frame': {'duration': 250, 'redraw': True}, 'fromcurrent': True, 'transition': {'duration': 0}}
+    layout = {
+        # the template is inlined, an unvalidated figure would send just its name
+        'template': pio.templates['plotly_dark'].to_plotly_json(),
+        'barmode': 'stack',
+        'height': 900,
+        'showlegend': False,
+        'title': frames[0]['layout']['title'],
+        # the two rows make_subplots(rows=2, vertical_spacing=0.08) would lay out
+        'xaxis': {'anchor': 'y', 'domain': [0.0, 1.0], **frames[0]['layout']['xaxis']},
+        'yaxis': {'anchor': 'x', 'domain': [0.54, 1.0], **frames[0]['layout']['yaxis']},
+        'xaxis2': {'anchor': 'y2', 'domain': [0.0, 1.0]},
+        'yaxis2': {'anchor': 'x2', 'domain': [0.0, 0.46], 'type': 'category'},
+        'updatemenus': [{
+            'type': 'buttons',
+            'direction': 'left',
+            'x': 0, 'y': -0.05, 'xanchor': 'left', 'yanchor': 'top',
+            'buttons': [
+                {'label': 'Run', 'method': 'animate', 'args': [None, play_args]},
+                {'label': 'Pause', 'method': 'animate', 'args': [[None], {'frame': {'duration': 0, 'redraw': False}, 'mode': 'immediate'}]},
+            ],
+        }],
+        'sliders': [{
+            'x': 0.15, 'y': -0.05, 'len': 0.85,
+            'currentvalue': {'visible': False},
+            'steps': [{'label': frame['name'], 'method': 'animate',
+                       'args': [[frame['name']], {'mode': 'immediate', 'frame': {'duration': 0, 'redraw': True}}]}
+                      for frame in frames],
+        }],
+    }
+    return spec_figure({'data': data, 'layout': layout, 'frames': frames})
+
+
+def spec_figure(spec):
+    """
+    A figure that hands out spec as its contents. plotly_chart turns a
+    figure into a dict and validates a dict it is given - for a spec
+    of a thousand frames either takes seconds, and the spec built here
+    is already valid
+    """
+    import plotly.graph_objects as go
+
+    class SpecFigure(go.Figure):
+        def to_dict(self):
+            return spec
+
+        def to_plotly_json(self):
+            return spec
+
+    return SpecFigure()
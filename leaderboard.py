@@ -0,0 +1,123 @@
+from collections import namedtuple
+
+import pandas as pd
+import streamlit as st
+
+import shared_cache
+import sql_backend
+
+# name -> function of the (Member, restaurant) table returning a value per member
+METRICS = {}
+
+Award = namedtuple('Award', ['label', 'metric', 'best'])
+# shown in registration order
+AWARDS = []
+
+
+def metric(name):
+    """
+    Registers a per-member metric computed from the
+    (Member, restaurant) table rather than the meal log
+    """
+    def register(func):
+        METRICS[name] = func
+        return func
+    return register
+
+
+def register_award(label, metric_name, best='max'):
+    """
+    Adds an award going to the member with the max (or min) metric
+    """
+    AWARDS.append(Award(label, metric_name, best))
+
+
+def member_restaurant_table(df):
+    """
+    The single pass over the meal log - visits, spend, priced meals
+    and free meals for every (Member, restaurant) pair
+    """
+    price = df['discount_meal_price']
+    pairs = df.assign(priced=price.notna(), free=price.eq(0)).groupby(['Member', 'restaurant'], observed=True)
+    return pairs.agg(
+        visits=('discount_meal_price', 'size'),
+        spend=('discount_meal_price', 'sum'),
+        priced=('priced', 'sum'),
+        free=('free', 'sum'),
+    )
+
+
+def _by_member(pairs):
+    return pairs.groupby(level='Member', observed=True)
+
+
+@metric('meals')
+def meals(pairs):
+    return _by_member(pairs)['visits'].sum()
+
+@metric('unique_restaurants')
+def unique_restaurants(pairs):
+    return _by_member(pairs).size()
+
+@metric('avg_meal_price')
+def avg_meal_price(pairs):
+    totals = _by_member(pairs)[['spend', 'priced']].sum()
+    return totals['spend'] / totals['priced']
+
+@metric('total_spend')
+def total_spend(pairs):
+    return _by_member(pairs)['spend'].sum()
+
+@metric('most_visits_to_one')
+def most_visits_to_one(pairs):
+    return _by_member(pairs)['visits'].max()
+
+@metric('mcdonalds')
+def mcdonalds(pairs):
+    # only the pair table's restaurant names are searched, not every meal
+    restaurants = pairs.index.get_level_values('restaurant').astype(str)
+    is_mcdonalds = restaurants.str.contains("McDonald's", case=False, regex=False)
+    return pairs['visits'].where(is_mcdonalds, 0).groupby(level='Member', observed=True).sum()
+
+@metric('free_meals')
+def free_meals(pairs):
+    return _by_member(pairs)['free'].sum()
+
+
+register_award('🏆 Most Boni: ', 'meals')
+register_award('🆕 Most Unique Boni: ', 'unique_restaurants')
+register_award('🏦 Most Frugal: ', 'avg_meal_price', best='min')
+register_award('🐏 Life is not Sheep: ', 'avg_meal_price')
+register_award('💤 Most on one Boni: ', 'most_visits_to_one')
+register_award("🍔 Most McDonald's: ", 'mcdonalds')
+register_award("👩‍🎓 Most Free Boni: ", 'free_meals')
+register_award('👎 Least Boni: ', 'meals', best='min')
+
+
+@st.cache_data(show_spinner=False, max_entries=8)
+@shared_cache.shared_result
+def get_leaderboard(data_version, _df):
+    """
+    Returns (pairs, metrics): the (Member, restaurant) table and every
+    registered metric as a column per member, computed once per data version
+    """
+    db = sql_backend.meal_database(data_version)
+    if db is not None:
+        table = sql_backend.member_restaurant_totals(db).to_pandas()
+        pairs = table.set_index(['Member', 'restaurant'])
+    else:
+        pairs = member_restaurant_table(_df)
+    metrics = pd.DataFrame({name: func(pairs) for name, func in METRICS.items()})
+    return pairs, metrics
+
+
+def award_winners(metrics):
+    """
+    (label, winning member) for each registered award
+    """
+    winners = []
+    for award in AWARDS:
+        values = metrics[award.metric]
+        winner = values.idxmax() if award.best == 'max' else values.idxmin()
+        winners.append((award.label, winner))
+    return winners
@@ -1,44 +1,34 @@
+# time this run from before the page's own imports
+import profiling
+page_timer = profiling.start_page('Journey')
 import streamlit as st
-import pandas as pd
-import numpy as np
-import plotly.express as px
+import altair as alt
 from datetime import timedelta
-import time
 from streamlit.logger import get_logger
-from utils import create_header_triplet, initialise_session_states
+from utils import create_header_triplet, initialise_session_states, wait_for_warmup
+from cumulative_visits import build_visit_events
+from rollups import build_rollups
+from animation import animate, speed_control
+from chart_data import chart_spec
+from journey_animation import VISIT_COLOURS, build_journey_animation
 
 
 LOGGER = get_logger(__name__)
 
-def select_member_df(df):
-    return df[df['Member'] == st.session_state.member]
+# Get Boni summary statistics, both count the days before the end date
+def get_unique_boni(rollups):
+    return int(rollups.unique(st.session_state.member, end=get_end_date()))
 
-def cum_sum_restaurant_visits(df):
-    df2 = df.groupby([pd.Grouper(key="date", freq="D"), "restaurant"]).size().unstack().fillna(0).reset_index()
-    return df2
-
-def fill_missing_dates(df):
-    """
-    Make dataframe continuos by date for dynamic plotting!
-    """
-    df_filled = df.set_index('date').resample('D').first().fillna(0).cumsum()
-    return df_filled.reset_index()
-
-
-# Get Boni summary statistics
-def get_unique_boni(df):
-    return len(df[df['date'] < get_end_date()]['restaurant'].unique())
-
-def get_boni_total(df):
-    return df[df['date'] < get_end_date()]['discount_meal_price'].sum()
+def get_boni_total(rollups):
+    return float(rollups.spend(st.session_state.member, end=get_end_date()))
 
 
 # Session state functions
-def update_session_state(df_cumsum):
+def update_session_state(visits, days=1):
     if 'end_date' not in st.session_state:
-        st.session_state.end_date = df_cumsum['date'].min()
+        st.session_state.end_date = visits.dates()[0]
     else:
-        st.session_state.end_date += timedelta(days=1)
+        st.session_state.end_date = min(st.session_state.end_date + timedelta(days=days), visits.dates()[-1])
 
 def get_end_date():
     if 'end_date' not in st.session_state:
@@ -46,68 +36,77 @@ def get_end_date():
     return st.session_state.end_date
 
 # Updating Plots and Summary values
-def update_chart_stacked(df_cumsum, plot_container):
-    # Get the subset of data up to the specified date
-    end_date_subset = st.session_state.end_date
-    df_subset = df_cumsum[df_cumsum['date'] <= end_date_subset]
-
-    # Melt DataFrame for Plotly Express
-    df_melted = df_subset.melt(id_vars='date', var_name='Restaurant', value_name='Cumulative Visits')
-
-    # Create a bar chart using Plotly Express
-    fig = px.bar(df_melted, x='date', y='Cumulative Visits', color='Restaurant',
-                labels={'Cumulative Visits': 'Count'},
-                template='plotly_dark',
-                category_orders={'Restaurant': df_melted.groupby('Restaurant')['Cumulative Visits'].sum().sort_values(ascending=False).index})
-
-    # Update the container with the new plot
-    plot_container.plotly_chart(fig, use_container_width=True, key=f"bar_chart_{time.time()}")
-
-def update_chart_bar(df_cumsum, plot_container):
-    # Get the subset of data up to the specified date
-    end_date_subset = st.session_state.end_date
-    df_subset = df_cumsum[(df_cumsum['date'] <= end_date_subset) & (df_cumsum['date'] >= end_date_subset)]
-
-    # Melt DataFrame for Plotly Express
+def journey_visits(visits):
+    """Long (date, Restaurant, Cumulative Visits) rows up to the end date, restaurants not yet visited left out."""
+    df_subset = visits.table(st.session_state.end_date)
     df_melted = df_subset.melt(id_vars='date', var_name='Restaurant', value_name='Cumulative Visits')
-    df_melted = df_melted.sort_values(by = 'Cumulative Visits', ascending = True)
-    # remove restaurants with no visits
-    df_melted = df_melted[df_melted['Cumulative Visits'] > 0]
-    df_melted['Visits'] = np.where(df_melted['Cumulative Visits'] == 1, '1 visit', np.where(df_melted['Cumulative Visits'] == 2, '2 visits', '2+ visits'))
-
-    # Create a bar chart using Plotly Express
-    color_discrete_map = {
-        '1 visit' : 'skyblue',
-        '2 visits' : 'lightcoral',
-        '2+ visits': 'lightgreen'
-    }
-    fig = px.bar(df_melted, x='Cumulative Visits', y='Restaurant',
-                color='Visits',
-                labels={'Cumulative Visits': 'Count'},
-                template='plotly_dark',
-                color_discrete_map=color_discrete_map)
-
-    # Update the container with the new plot
-    plot_container.plotly_chart(fig, use_container_width=True, key=f"bar_chart_{time.time()}")
-
-def update_summary_stats(df, date, total_euro, unique_boni):
+    return df_melted[df_melted['Cumulative Visits'] > 0].reset_index(drop=True)
+
+def visits_chart(data):
+    """Stacked visits by day over the visit counts of the last day, both from one dataset."""
+    stacked = alt.Chart(data).mark_bar().encode(
+        x=alt.X('yearmonthdate(date):T', title='date'),
+        y=alt.Y('sum(Cumulative Visits):Q', title='Count'),
+        color=alt.Color('Restaurant:N',
+                        sort=alt.EncodingSortField('Cumulative Visits', op='sum', order='descending'))
+    ).properties(height=400)
+    last_day = alt.Chart(data).transform_joinaggregate(
+        last_date='max(date)'
+    ).transform_filter(
+        # compared as times, dates from the Arrow data are Date objects and == would compare references
+        'time(datum.date) == time(datum.last_date)'
+    ).transform_calculate(
+        Visits="datum['Cumulative Visits'] == 1 ? '1 visit' : datum['Cumulative Visits'] == 2 ? '2 visits' : '2+ visits'"
+    ).mark_bar().encode(
+        x=alt.X('Cumulative Visits:Q', title='Count'),
+        y=alt.Y('Restaurant:N', sort='-x'),
+        color=alt.Color('Visits:N', scale=alt.Scale(domain=list(VISIT_COLOURS), range=list(VISIT_COLOURS.values())))
+    ).properties(height=400)
+    return alt.vconcat(stacked, last_day).resolve_scale(color='independent')
+
+def update_visual_charts(visits, plot_container):
+    with profiling.stage('aggregation') as s:
+        data = s.payload(journey_visits(visits))
+
+    with profiling.stage('chart'):
+        chart = visits_chart(alt.NamedData('visits'))
+
+    # a stable key updates the element in place, and a redraw without new data (paused) is a
+    # cache reference. A tick still sends the whole history up to end date - Browser mode
+    # (display_journey_animation) is the one that sends the journey once
+    with profiling.stage('serialise') as s:
+        plot_container.vega_lite_chart(s.payload(chart_spec(chart, {'visits': data})),
+                                       use_container_width=True, key="journey_visits")
+
+# Client side animation
+def display_journey_animation(rollups, visits, plot_container):
+    """Sends the whole animation once, playback then runs in the browser."""
+    with profiling.stage('chart'):
+        fig = build_journey_animation(st.session_state.member, st.session_state.data_version, rollups, visits)
+    with profiling.stage('serialise') as s:
+        plot_container.plotly_chart(s.payload(fig), use_container_width=True, key="journey_animation")
+
+def update_summary_stats(rollups, date, total_euro, unique_boni):
     # update top row
     date.write("Current Date: " + str(get_end_date())[:10])
-    total_euro.write("Total Spend: €" + str(round(get_boni_total(df), 2)))
-    unique_boni.write("Tried " + str(get_unique_boni(df)) + " Boni")
+    total_euro.write("Total Spend: €" + str(round(get_boni_total(rollups), 2)))
+    unique_boni.write("Tried " + str(get_unique_boni(rollups)) + " Boni")
 
 
 def setup_header():
     """Initializes session states and header UI."""
     st.set_page_config(page_title="Journey", page_icon="🗺️", layout="wide")
-    initialise_session_states()
+    with profiling.stage('data load'):
+        initialise_session_states()
     create_header_triplet()
 
 def load_data():
     """Loads and processes the dataset."""
-    df = select_member_df(st.session_state.combined_df)
-    df_cumsum = fill_missing_dates(cum_sum_restaurant_visits(df))
-    return df, df_cumsum
+    # shared with Horse Race, on the same date axis
+    with profiling.stage('aggregation'):
+        visits = build_visit_events(st.session_state.aggregates, st.session_state.data_version).member(st.session_state.member)
+        rollups = build_rollups(st.session_state.data_version, st.session_state.combined_df)
+    return rollups, visits
 
 def on_member_change():
     st.session_state.member = st.session_state.selected_member
@@ -129,61 +128,65 @@ def setup_top_row_controls():
 
     return date, total_euro, unique_boni, reset_button, run_button
 
-def handle_reset(df_cumsum, plot_container_stacked, plot_container_bar):
+def handle_reset(visits):
     """Handles the reset button functionality."""
     if st.session_state.reset_button.button("Reset Data"):
-        st.session_state.end_date = df_cumsum['date'].min() - timedelta(1)
-        update_chart_stacked(df_cumsum, plot_container_stacked)
-        update_chart_bar(df_cumsum, plot_container_bar)
-
-def run_simulation(df, df_cumsum, plot_container_stacked, plot_container_bar, date, total_euro, unique_boni):
-    """Runs the dynamic journey simulation."""
-    while st.session_state.run_button and (get_end_date() == "" or get_end_date() < df_cumsum['date'].max()):
-        update_session_state(df_cumsum)
-        update_summary_stats(df, date, total_euro, unique_boni)
-        update_chart_stacked(df_cumsum, plot_container_stacked)
-        update_chart_bar(df_cumsum, plot_container_bar)
-        time.sleep(0.25)  # Simulates time passing
-        total_euro.empty()
-        st.markdown("")
-
-def update_visuals(df, df_cumsum, plot_container_stacked, plot_container_bar, date, total_euro, unique_boni):
-    """Updates visuals when simulation is paused."""
-    if 'end_date' not in st.session_state:
-        st.session_state.end_date = df_cumsum['date'].min() - timedelta(1)
-    update_chart_stacked(df_cumsum, plot_container_stacked)
-    update_chart_bar(df_cumsum, plot_container_bar)
-    update_summary_stats(df, date, total_euro, unique_boni)
-
+        st.session_state.end_date = visits.dates()[0] - timedelta(1)
+
+def advance(visits, days):
+    """Moves the journey on by days, False once it has reached the last day."""
+    if get_end_date() >= visits.dates()[-1]:
+        return False
+    update_session_state(visits, days)
+    return True
+
+def draw_frame(rollups, visits):
+    """Draws the summary row and both charts for the current end date."""
+    # aligned with the top row, drawn here as the animation redraws it every frame
+    date, total_euro, unique_boni = st.columns(6)[:3]
+    update_summary_stats(rollups, date, total_euro, unique_boni)
+    update_visual_charts(visits, st.empty())
+
+@profiling.instrumented('Journey')
 def run():
     setup_header()
-    df, df_cumsum = load_data()
+    if not wait_for_warmup(['cumulative visits', 'rollups'], "the journey"):
+        return
+    rollups, visits = load_data()
 
     # Set up UI elements
     date, total_euro, unique_boni, reset_button, run_button_placeholder = setup_top_row_controls()
 
     # Clear columns
     date = date.empty()
-    total_euro = total_euro.empty()
-    unique_boni = unique_boni.empty()
+    total_euro.empty()
+    unique_boni.empty()
     reset_button.empty()
 
-    run_button = run_button_placeholder.checkbox("Run / Pause", False)
+    # In the browser mode, the default, the server sends one animated figure and is done
+    render_mode = st.sidebar.radio("Animation", ("Browser", "Server"), key='journey_render_mode',
+                                   help="Browser sends the whole journey once and plays it client side, "
+                                        "Server resends the history up to the current day every frame")
+    if render_mode == "Browser":
+        date.write("Press Run on the chart")
+        display_journey_animation(rollups, visits, st.empty())
+        return
 
-    plot_container_stacked, plot_container_bar = st.empty(), st.empty()
+    run_button = run_button_placeholder.checkbox("Run / Pause", False)
+    speed_control()
 
-    # Store button states in session state
+    # Store the reset button in session state
     st.session_state.reset_button = reset_button
-    st.session_state.run_button = run_button
 
     # Handle reset button logic
-    handle_reset(df_cumsum, plot_container_stacked, plot_container_bar)
-
-    # Run simulation if active
-    run_simulation(df, df_cumsum, plot_container_stacked, plot_container_bar, date, total_euro, unique_boni)
+    if 'end_date' not in st.session_state:
+        st.session_state.end_date = visits.dates()[0] - timedelta(1)
+    handle_reset(visits)
 
-    # Update visuals when paused
-    update_visuals(df, df_cumsum, plot_container_stacked, plot_container_bar, date, total_euro, unique_boni)
+    # Frames are drawn by a timed fragment, so pause and reset apply right away
+    running = run_button and get_end_date() < visits.dates()[-1]
+    animate('journey', running, lambda days: advance(visits, days), lambda: draw_frame(rollups, visits), page='Journey')
 
 if __name__ == "__main__":
-    run()
\ No newline at end of file
+    run()
+    page_timer.rendered()
\ No newline at end of file
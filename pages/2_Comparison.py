@@ -1,124 +1,111 @@
+# time this run from before the page's own imports
+import profiling
+page_timer = profiling.start_page('Comparison')
 import streamlit as st
-import pandas as pd
 import altair as alt
-from utils import create_header_triplet, initialise_session_states
-
-# who ate the most boni
-def who_ate_most(df):
-    return df['Member'].value_counts().idxmax()
-
-def who_most_unique(df):
-    return df.groupby('Member')['restaurant'].nunique().idxmax()
-
-def least_avg_boni(df):
-    return df.groupby('Member')['discount_meal_price'].agg('mean').idxmin()
-
-def most_avg_boni(df):
-    return df.groupby('Member')['discount_meal_price'].agg('mean').idxmax()
-
-def who_most_one_boni(df):
-    return df.groupby('Member')['restaurant'].value_counts().idxmax()[0]
-
-def who_ate_most_mcdonalds(df):
-    # Filter the DataFrame to include only rows where the restaurant contains "McDonald's"
-    mcdonalds_data = df[df['restaurant'].str.contains("McDonald's", case=False, na=False)]
-    # Group by Member and count the occurrences
-    mcdonalds_counts = mcdonalds_data['Member'].value_counts()
-    # Get the member who ate at a McDonald's restaurant the most
-    most_mcdonalds_member = mcdonalds_counts.idxmax()
-    return most_mcdonalds_member
-
-def who_most_free_boni(df):
-    # Filter the DataFrame to include only rows where 'discount_meal_price' is 0
-    df = df[df['discount_meal_price'] == 0]
-    
-    # Group by 'Member' and count the occurrences
-    member_counts = df['Member'].value_counts()
-    
-    # Get the member who had the most free boni
-    most_free_boni_member = member_counts.idxmax()
-    
-    return most_free_boni_member
-
-def who_used_least(df):
-    return df['Member'].value_counts().idxmin()
-
-def display_top_statistics(df):
-    """Displays top statistics on Boni consumption."""
-    most_boni, most_unique_boni, most_frugal, quality = st.columns(4)
-    most_boni.text('🏆 Most Boni: ' + who_ate_most(df))
-    most_unique_boni.text('🆕 Most Unique Boni: ' + who_most_unique(df))
-    most_frugal.text('🏦 Most Frugal: ' + least_avg_boni(df))
-    quality.text('🐏 Life is not Sheep: ' + most_avg_boni(df))
-
-    most_one_boni, most_maccies, most_free, least_boni = st.columns(4)
-    most_one_boni.text('💤 Most on one Boni: ' + who_most_one_boni(df))
-    most_maccies.text("🍔 Most McDonald's: " + who_ate_most_mcdonalds(df))
-    most_free.text("👩‍🎓 Most Free Boni: " + who_most_free_boni(df))
-    least_boni.text('👎 Least Boni: ' + who_used_least(df))
-
+from utils import create_header_triplet, initialise_session_states, wait_for_warmup
+from leaderboard import award_winners, get_leaderboard
+from density import price_density
+from streaks import get_streaks
+from chart_data import chart_spec
 
-def plot_boni_diversity(df):
-    """Creates and displays the Boni diversity plot."""
-    rest_count_by_member = df.groupby(['Member', 'restaurant']).size().reset_index(name='count')
-    rest_count_by_member['percentage'] = rest_count_by_member.groupby('Member')['count'].transform(lambda x: x / x.sum() * 100)
-
-    chart = alt.Chart(rest_count_by_member).mark_bar().encode(
+def display_top_statistics(metrics):
+    """Displays top statistics on Boni consumption."""
+    winners = award_winners(metrics)
+    # four awards to a row
+    for row_start in range(0, len(winners), 4):
+        row = winners[row_start:row_start + 4]
+        for col, (label, member) in zip(st.columns(4), row):
+            col.text(label + member)
+
+
+def display_streak_leaderboard(summary):
+    """Displays every member's longest and current streak."""
+    leaderboard = summary.reset_index()
+    leaderboard['longest_start'] = leaderboard['longest_start'].dt.strftime('%d %b %Y')
+    leaderboard['longest_end'] = leaderboard['longest_end'].dt.strftime('%d %b %Y')
+    leaderboard.columns = ['Member', '🗓️ Longest Streak', 'From', 'To', '🔥 Current Streak']
+    st.dataframe(leaderboard, hide_index=True, use_container_width=True)
+
+
+def boni_diversity_chart(pairs):
+    """Share of each member's meals per restaurant."""
+    return alt.Chart(pairs).mark_bar().transform_joinaggregate(
+        meals='sum(visits)', groupby=['Member']
+    ).transform_calculate(
+        percentage='datum.visits / datum.meals * 100'
+    ).encode(
         y=alt.Y('Member:N', sort='-x', axis=alt.Axis(title='Member', labels=True, ticks=True)),
         x=alt.X("percentage:Q", title='Percentage'),
         color='restaurant:N',
-        order=alt.Order('count', sort='descending')
+        order=alt.Order('visits:Q', sort='descending')
     ).properties(title="🆕 Diversity")
 
-    st.altair_chart(chart, use_container_width=True)
 
+def money_spent_chart(pairs):
+    """Total money spent by each member."""
+    return alt.Chart(pairs).mark_bar(color="#23BDF3").encode(
+        y=alt.Y('Member:N', sort='-x', axis=alt.Axis(title='Member', labels=True, ticks=True)),
+        x=alt.X('sum(spend):Q', title='Total €')
+    ).properties(title='💰 Total Spend')
 
-def plot_money_spent(df):
-    """Creates and displays the total money spent by each member."""
-    money_spent_by_member = df.groupby(['Member'])['discount_meal_price'].sum().reset_index()
-    money_spent_by_member.columns = ['Member', 'Total']
 
-    chart = alt.Chart(money_spent_by_member).mark_bar().encode(
-        y=alt.Y('Member:N', sort='-x', axis=alt.Axis(title='Member', labels=True, ticks=True)),
-        x=alt.X('Total:Q', title='Total €')
-    ).configure_mark(color="#23BDF3").properties(title='💰 Total Spend')
+def plot_member_restaurant_charts(pairs):
+    """Displays the diversity and money spent charts, both drawn from one copy of the pair table."""
+    data = pairs[['visits', 'spend']].reset_index()
+    data['spend'] = data['spend'].astype(float).round(2)
 
-    st.altair_chart(chart, use_container_width=True)
+    with profiling.stage('chart'):
+        pairs_data = alt.NamedData('pairs')
+        chart = alt.vconcat(boni_diversity_chart(pairs_data), money_spent_chart(pairs_data)).resolve_scale(color='independent')
+    with profiling.stage('serialise') as s:
+        st.vega_lite_chart(s.payload(chart_spec(chart, {'pairs': data})), use_container_width=True)
 
 
 def plot_spend_distribution(df):
     """Creates and displays the distribution of meal prices by member."""
-    chart = alt.Chart(df).transform_density(
-        'discount_meal_price',
-        as_=['discount_meal_price', 'density'],
-        groupby=['Member']
-    ).mark_line().encode(
-        x=alt.X('discount_meal_price:Q', title='Meal Price'),
-        y=alt.Y('density:Q', title='Density'),
-        color=alt.Color('Member:N', title='Member'),
-        tooltip=['discount_meal_price:Q', 'density:Q']
-    ).properties(title="Meal Price by Member")
-
-    st.altair_chart(chart, use_container_width=True)
-
-
+    # density is estimated server side, only the grid points are sent
+    density = price_density(st.session_state.data_version, df)
+    with profiling.stage('chart'):
+        chart = alt.Chart(alt.NamedData('price_density')).mark_line().encode(
+            x=alt.X('discount_meal_price:Q', title='Meal Price'),
+            y=alt.Y('density:Q', title='Density'),
+            color=alt.Color('Member:N', title='Member'),
+            tooltip=['discount_meal_price:Q', 'density:Q']
+        ).properties(title="Meal Price by Member")
+    with profiling.stage('serialise') as s:
+        st.vega_lite_chart(s.payload(chart_spec(chart, {'price_density': density})), use_container_width=True)
+
+
+@profiling.instrumented('Comparison')
 def run():
     st.set_page_config(
         page_title="Journey",
         page_icon="🗺️",
         layout="wide"
     )
-    initialise_session_states()
+    with profiling.stage('data load'):
+        initialise_session_states()
     create_header_triplet()
+    if not wait_for_warmup(['leaderboard', 'streaks', 'price density'], "the comparison"):
+        return
 
     df = st.session_state.combined_df
+    # one grouped pass feeds the awards and the first two charts
+    with profiling.stage('aggregation') as s:
+        pairs, metrics = s.payload(get_leaderboard(st.session_state.data_version, df))
+        streaks = get_streaks(st.session_state.data_version, df)['summary']
 
     # Display statistics
-    display_top_statistics(df)
+    display_top_statistics(metrics)
+    display_streak_leaderboard(streaks)
 
     # Display charts
-    plot_boni_diversity(df)
-    plot_money_spent(df)
-    plot_spend_distribution(df)
-
-run()
+    with profiling.stage('diversity and money spent'):
+        plot_member_restaurant_charts(pairs)
+    with profiling.stage('spend distribution'):
+        plot_spend_distribution(df)
+
+if __name__ == "__main__":
+    run()
+    page_timer.rendered()
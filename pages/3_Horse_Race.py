@@ -1,34 +1,19 @@
+# time this run from before the page's own imports
+import profiling
+page_timer = profiling.start_page('Horse Race')
 import streamlit as st
 import plotly.express as px
-import pandas as pd
 from datetime import timedelta
-import time
-from utils import create_header_triplet, pre_process_df, initialise_session_states
-
-# Processing dataframe functions
-def cum_sum_restaurant_visits(df):
-    df2 = df.groupby([pd.Grouper(key="date", freq="D"), "restaurant"]).size().unstack().fillna(0).reset_index()
-    return df2
-
-def fill_missing_dates(df):
-    """
-    Make dataframe continuous by date for dynamic plotting!
-    """
-    # add a new row for the last recorded date of all members
-    if df['date'].max() < st.session_state.last_recorded_date:
-        new_row = pd.DataFrame(0, index=[0], columns=df.columns)
-        new_row['date'] = st.session_state.last_recorded_date
-        df = pd.concat([df, new_row], ignore_index=True)
-    # then fill in the gaps
-    df_filled = df.set_index('date').resample('D').first().fillna(0).cumsum()
-    return df_filled.reset_index()
+from utils import create_header_triplet, initialise_session_states, wait_for_warmup
+from cumulative_visits import build_visit_events
+from animation import animate, speed_control
 
 # Session state functions
-def update_session_state(df):
+def update_session_state(df, days=1):
     if 'end_date' not in st.session_state:
         st.session_state.end_date = df['date'].min()
     else:
-        st.session_state.end_date += timedelta(days=1)
+        st.session_state.end_date = min(st.session_state.end_date + timedelta(days=days), st.session_state.last_recorded_date)
 
 def get_end_date():
     if 'end_date' not in st.session_state:
@@ -37,41 +22,27 @@ def get_end_date():
 
 # Update chart
 def update_chart(df, plot_container):
-    # Get the subset of data up to the specified date
-    end_date_subset = st.session_state.end_date
-    df_melted = pd.DataFrame()
-    # for each member perform following separately and then combine the df
-    for member in df['Member'].unique():
-        df_member = df[df['Member'] == member]
-        df_cumsum = cum_sum_restaurant_visits(df_member)
-        # fill missing values
-        df_cumsum = fill_missing_dates(df_cumsum)
-        # Padd the df with zeros to max date for member in dataframe
-        df_subset = df_cumsum[(df_cumsum['date'] <= end_date_subset) & (df_cumsum['date'] >= end_date_subset)]
-        # Melt DataFrame for Plotly Express
-        df_melted_member = df_subset.melt(id_vars='date', var_name='Restaurant', value_name='Cumulative Visits')
-        df_melted_member['Member'] = member
-        df_melted = pd.concat([df_melted, df_melted_member])
- 
-    # remove restaurants with no visits
-    df_melted = df_melted[df_melted['Cumulative Visits'] > 0]
-    # sort member by which member has the most visits!
-
-    fig = px.bar(df_melted, x='Cumulative Visits', y='Member',
-                 title= "Boni Horse Race",
-                 color='Restaurant',
-                 labels={'Cumulative Visits': 'Count'},
-                 template='plotly_dark',
-                 category_orders={'Restaurant': df_melted.groupby('Restaurant')['Cumulative Visits'].sum().sort_values(ascending=False).index,
-                                  'Member': df_melted.groupby('Member')['Cumulative Visits'].sum().sort_values(ascending=False).index})
+    # Get the cumulative visits of every member up to the specified date
+    with profiling.stage('aggregation') as s:
+        visits = build_visit_events(st.session_state.aggregates, st.session_state.data_version)
+        df_melted = s.payload(visits.frame(st.session_state.end_date))
+
+    with profiling.stage('chart'):
+        fig = px.bar(df_melted, x='Cumulative Visits', y='Member',
+                     title= "Boni Horse Race",
+                     color='Restaurant',
+                     labels={'Cumulative Visits': 'Count'},
+                     template='plotly_dark',
+                     category_orders={'Restaurant': df_melted.groupby('Restaurant')['Cumulative Visits'].sum().sort_values(ascending=False).index,
+                                      'Member': df_melted.groupby('Member')['Cumulative Visits'].sum().sort_values(ascending=False).index})
 
     # sort by members most boni
     # Update the container with the new plot
-    plot_container.plotly_chart(fig, use_container_width=True, key=f"bar_chart_{time.time()}")
+    with profiling.stage('serialise') as s:
+        plot_container.plotly_chart(s.payload(fig), use_container_width=True, key="horse_race")
 
-def reset(df, plot_container):
+def reset(df):
     st.session_state.end_date = df['date'].min() - timedelta(1)
-    update_chart(df, plot_container)
 
 
 def setup_page():
@@ -80,7 +51,8 @@ def setup_page():
         page_icon="🍕",
         layout="wide"
     )
-    initialise_session_states()
+    with profiling.stage('data load'):
+        initialise_session_states()
     create_header_triplet()
 
 def clear_previous_page():
@@ -89,39 +61,42 @@ def clear_previous_page():
         col.empty()
 
 def create_controls():
-    date_placeholder, run_button_placeholder, reset_button_placeholder = st.columns(3)
+    run_button_placeholder, reset_button_placeholder, _ = st.columns(3)
     run_button = run_button_placeholder.checkbox("Run / Pause", False)
-    date_display = date_placeholder.empty()
-    plot_container = st.empty()
-    
-    return run_button, date_display, plot_container, reset_button_placeholder
 
-def reset_if_requested(reset_button, horse_race_df, plot_container):
+    return run_button, reset_button_placeholder
+
+def reset_if_requested(reset_button, horse_race_df):
     if reset_button.button("Reset Data"):
-        reset(horse_race_df, plot_container)
+        reset(horse_race_df)
 
-def run_simulation(run_button, horse_race_df, date_display, plot_container):
-    while run_button and (get_end_date() == "" or get_end_date() < horse_race_df['date'].max()):
-        update_session_state(horse_race_df)
-        update_chart(horse_race_df, plot_container)
-        date_display.write("Current Date: " + str(get_end_date())[:10])
-        time.sleep(0.25)
-        st.markdown("")
+def advance(horse_race_df, days):
+    if get_end_date() >= horse_race_df['date'].max():
+        return False
+    update_session_state(horse_race_df, days)
+    return True
 
-def update_paused_state(horse_race_df, date_display, plot_container):
-    if 'end_date' not in st.session_state:
-        st.session_state.end_date = horse_race_df['date'].min() - timedelta(1)
-    update_chart(horse_race_df, plot_container)
-    date_display.write("Current Date: " + str(get_end_date())[:10])
+def draw(horse_race_df):
+    st.write("Current Date: " + str(get_end_date())[:10])
+    update_chart(horse_race_df, st.empty())
 
+@profiling.instrumented('Horse Race')
 def run():
     setup_page()
+    if not wait_for_warmup(['cumulative visits'], "the horse race"):
+        return
     clear_previous_page()
     horse_race_df = st.session_state.combined_df
-    run_button, date_display, plot_container, reset_button = create_controls()
-    reset_if_requested(reset_button, horse_race_df, plot_container)
-    run_simulation(run_button, horse_race_df, date_display, plot_container)
-    update_paused_state(horse_race_df, date_display, plot_container)
+    run_button, reset_button = create_controls()
+    speed_control()
+    if 'end_date' not in st.session_state:
+        reset(horse_race_df)
+    reset_if_requested(reset_button, horse_race_df)
+    # frames are drawn by a timed fragment, so pause and reset apply right away
+    running = run_button and get_end_date() < horse_race_df['date'].max()
+    animate('horse_race', running, lambda days: advance(horse_race_df, days), lambda: draw(horse_race_df),
+            page='Horse Race')
 
 if __name__ == "__main__":
-    run()
\ No newline at end of file
+    run()
+    page_timer.rendered()
\ No newline at end of file
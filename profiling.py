@@ -0,0 +1,407 @@
+"""
+Startup profiling - import time of each top level module and time to
+first render of each page, for chasing slow cold starts.
+
+In the app, set BONI_PROFILE_STARTUP=1 and every page shows a
+"Startup profile" expander in the sidebar (also logged).
+
+For true cold numbers run each page in a fresh interpreter:
+
+    python profiling.py [pages/1_Journey.py ...]
+
+Hot path instrumentation - wall time and payload size of each stage
+of a rerun or animation tick. Set BONI_INSTRUMENT=1 for a "Timing
+breakdown" expander in the sidebar, and/or BONI_INSTRUMENT_LOG=path
+to append every record to a JSON lines file.
+"""
+import functools
+import importlib.abc
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+
+PROFILE_STARTUP = os.environ.get('BONI_PROFILE_STARTUP') == '1'
+INSTRUMENT_LOG = os.environ.get('BONI_INSTRUMENT_LOG')
+INSTRUMENT = os.environ.get('BONI_INSTRUMENT') == '1' or bool(INSTRUMENT_LOG)
+PAGES = ['Hello.py', 'pages/0_Dashboard.py', 'pages/1_Journey.py',
+         'pages/2_Comparison.py', 'pages/3_Horse_Race.py']
+
+_lock = threading.Lock()
+# top level module -> seconds its first import took, including
+# whatever it imported in turn
+import_seconds = {}
+# page -> {'first_render': seconds, 'last_render': seconds, 'runs': n, 'imports': [...]}
+page_renders = {}
+
+
+class _TimedLoader(importlib.abc.Loader):
+    def __init__(self, loader):
+        self.loader = loader
+
+    def create_module(self, spec):
+        return self.loader.create_module(spec)
+
+    def exec_module(self, module):
+        start = time.perf_counter()
+        try:
+            self.loader.exec_module(module)
+        finally:
+            with _lock:
+                import_seconds.setdefault(module.__name__, time.perf_counter() - start)
+
+    def __getattr__(self, name):
+        return getattr(self.loader, name)
+
+
+class ImportTimer(importlib.abc.MetaPathFinder):
+    """
+    Wraps the loader of every top level module imported
+    from now on so its first import is timed
+    """
+    _finding = threading.local()
+
+    def find_spec(self, name, path=None, target=None):
+        if '.' in name or getattr(self._finding, 'active', False):
+            return None
+        self._finding.active = True
+        try:
+            for finder in sys.meta_path:
+                if finder is self or not hasattr(finder, 'find_spec'):
+                    continue
+                spec = finder.find_spec(name, path, target)
+                if spec is not None:
+                    break
+            else:
+                return None
+        finally:
+            self._finding.active = False
+        if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+            spec.loader = _TimedLoader(spec.loader)
+        return spec
+
+
+def enable():
+    """
+    Starts timing imports, once per process
+    """
+    if not any(isinstance(finder, ImportTimer) for finder in sys.meta_path):
+        sys.meta_path.insert(0, ImportTimer())
+
+
+def _top_level_modules():
+    return {name for name in list(sys.modules) if '.' not in name and not name.startswith('_')}
+
+
+class PageTimer:
+    """
+    Times one script run of a page, from start_page() at the top
+    of the script (before its own imports) to rendered()
+    """
+    def __init__(self, page):
+        self.page = page
+        self.start = time.perf_counter()
+        self.modules_before = _top_level_modules()
+
+    def rendered(self):
+        seconds = time.perf_counter() - self.start
+        imported = sorted(_top_level_modules() - self.modules_before)
+        with _lock:
+            stats = page_renders.setdefault(self.page, {'first_render': seconds, 'runs': 0, 'imports': imported})
+            stats['last_render'] = seconds
+            stats['runs'] += 1
+        if PROFILE_STARTUP:
+            _log_render(self.page, seconds, imported)
+            display_profile()
+        return seconds
+
+
+class _NoopTimer:
+    def rendered(self):
+        return None
+
+
+def start_page(page):
+    """
+    Call first thing in a page script, then .rendered() after run().
+    Does nothing unless startup profiling is on
+    """
+    if not PROFILE_STARTUP:
+        return _NoopTimer()
+    return PageTimer(page)
+
+
+def _log_render(page, seconds, imported):
+    from streamlit.logger import get_logger
+    get_logger(__name__).info("%s rendered in %.3fs, imported %s", page, seconds, ', '.join(imported) or 'nothing')
+
+
+def profile_report(top=15):
+    """
+    The slowest top level imports and each page's render times
+    """
+    with _lock:
+        imports = sorted(import_seconds.items(), key=lambda item: item[1], reverse=True)[:top]
+        pages = {page: dict(stats) for page, stats in page_renders.items()}
+    return {'imports': [{'module': name, 'seconds': round(seconds, 4)} for name, seconds in imports],
+            'pages': pages}
+
+
+def display_profile():
+    import streamlit as st
+    report = profile_report()
+    with st.sidebar.expander("Startup profile"):
+        st.caption("Import time (first import in this process)")
+        st.dataframe(report['imports'], hide_index=True, use_container_width=True)
+        st.caption("Page render time (seconds)")
+        st.dataframe([{'page': page, 'first': round(stats['first_render'], 3), 'last': round(stats['last_render'], 3),
+                       'runs': stats['runs'], 'new imports': ', '.join(stats['imports'])}
+                      for page, stats in report['pages'].items()],
+                     hide_index=True, use_container_width=True)
+
+
+if PROFILE_STARTUP:
+    enable()
+
+
+# page -> the latest rerun and tick records, newest last
+recent_records = defaultdict(lambda: deque(maxlen=200))
+# each script run has its own thread, so records and stage names nest per thread
+_active = threading.local()
+
+
+def payload_size(obj):
+    """
+    Rough size in bytes of what a stage produced or sent - frames by
+    memory use, charts by the JSON they serialise to
+    """
+    if obj is None:
+        return 0
+    if hasattr(obj, 'memory_usage'):
+        usage = obj.memory_usage(deep=True)
+        return int(usage.sum() if hasattr(usage, 'sum') else usage)
+    if hasattr(obj, 'to_json'):
+        return len(obj.to_json())
+    if isinstance(obj, (bytes, str)):
+        return len(obj)
+    if hasattr(obj, 'nbytes'):
+        return int(obj.nbytes)
+    if isinstance(obj, dict):
+        return sum(payload_size(value) for value in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return sum(payload_size(value) for value in obj)
+    return sys.getsizeof(obj)
+
+
+def _records():
+    if not hasattr(_active, 'records'):
+        _active.records, _active.stages = [], []
+    return _active.records
+
+
+class RunRecord:
+    """
+    Stage timings of one rerun or animation tick of a page
+    """
+    def __init__(self, page, kind):
+        self.page = page
+        self.kind = kind
+        self.started = time.time()
+        self.start = time.perf_counter()
+        self.stages = []
+        self.ticks = 0
+        self.seconds = None
+        self.interrupted = None
+
+    def __enter__(self):
+        _records().append(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        records = _records()
+        records.pop()
+        self.seconds = time.perf_counter() - self.start
+        # reruns and st.stop() end a script run with an exception
+        self.interrupted = exc_type.__name__ if exc_type is not None else None
+        if self.kind == 'tick' and records:
+            records[-1].ticks += 1
+        _export(self)
+        return False
+
+    def as_dict(self):
+        return {'page': self.page, 'kind': self.kind, 'started': self.started,
+                'seconds': round(self.seconds, 6), 'ticks': self.ticks, 'interrupted': self.interrupted,
+                'stages': [{'stage': name, 'seconds': round(seconds, 6), 'payload_bytes': size}
+                           for name, seconds, size in self.stages]}
+
+
+class Stage:
+    """
+    Times a block as a stage of the innermost record. Nested stages
+    are named by their path, e.g. "cost by month > serialise"
+    """
+    def __init__(self, name):
+        self.name = name
+        self.obj = None
+
+    def payload(self, obj):
+        """
+        Marks obj as what this stage produced, sized once the stage ends
+        """
+        self.obj = obj
+        return obj
+
+    def __enter__(self):
+        _records()
+        _active.stages.append(self.name)
+        self.path = ' > '.join(_active.stages)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.start
+        _active.stages.pop()
+        if _active.records:
+            _active.records[-1].stages.append((self.path, seconds, payload_size(self.obj)))
+        return False
+
+
+class _NoopStage:
+    def payload(self, obj):
+        return obj
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_STAGE = _NoopStage()
+
+
+def stage(name):
+    """
+    with stage('aggregation') as s: ... s.payload(result)
+    Costs nothing unless instrumentation is on
+    """
+    return Stage(name) if INSTRUMENT else _NOOP_STAGE
+
+
+def record(page, kind='rerun'):
+    """
+    Collects the stages of one rerun or one animation tick
+    """
+    return RunRecord(page, kind) if INSTRUMENT else _NOOP_STAGE
+
+
+def instrumented(page):
+    """
+    Decorates a page's run() so each rerun is recorded
+    and its breakdown shown in the sidebar
+    """
+    def decorate(func):
+        if not INSTRUMENT:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with record(page):
+                result = func(*args, **kwargs)
+            display_instrumentation(page)
+            return result
+        return wrapper
+    return decorate
+
+
+def _export(run_record):
+    data = run_record.as_dict()
+    with _lock:
+        recent_records[run_record.page].append(data)
+        if INSTRUMENT_LOG:
+            with open(INSTRUMENT_LOG, 'a') as f:
+                f.write(json.dumps(data) + '\n')
+
+
+def stage_summary(records):
+    """
+    Median time and payload of each stage over records, slowest first
+    """
+    import pandas as pd
+    rows = [dict(stage, kind=r['kind']) for r in records for stage in r['stages']]
+    if not rows:
+        return pd.DataFrame(columns=['kind', 'stage', 'runs', 'median ms', 'max ms', 'median KiB'])
+    df = pd.DataFrame(rows)
+    summary = df.groupby(['kind', 'stage'], sort=False).agg(
+        runs=('seconds', 'size'), median_s=('seconds', 'median'), max_s=('seconds', 'max'),
+        median_bytes=('payload_bytes', 'median')).reset_index()
+    summary['median ms'] = (summary.pop('median_s') * 1000).round(2)
+    summary['max ms'] = (summary.pop('max_s') * 1000).round(2)
+    summary['median KiB'] = (summary.pop('median_bytes') / 1024).round(1)
+    return summary.sort_values(by='median ms', ascending=False)
+
+
+def display_instrumentation(page):
+    import streamlit as st
+    with _lock:
+        records = list(recent_records[page])
+    reruns = [r for r in records if r['kind'] == 'rerun']
+    with st.sidebar.expander("Timing breakdown"):
+        if reruns:
+            st.caption(f"Last rerun {reruns[-1]['seconds'] * 1000:.0f} ms, {reruns[-1]['ticks']} animation ticks")
+        st.dataframe(stage_summary(records), hide_index=True, use_container_width=True)
+        import shared_cache
+        cache = shared_cache.cache_stats()
+        if cache['backend']:
+            st.caption(f"Shared {cache['backend']} cache, {cache['evictions']} evictions")
+            st.dataframe([dict(function=name, **counts) for name, counts in cache['functions'].items()],
+                         hide_index=True, use_container_width=True)
+
+
+_COLD_RUN = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+import profiling
+profiling.enable()
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+streamlit_seconds = time.perf_counter() - start
+app = AppTest.from_file({page!r}, default_timeout=120)
+start = time.perf_counter()
+app.run()
+report = profiling.profile_report()
+report['streamlit_seconds'] = streamlit_seconds
+report['first_run_seconds'] = time.perf_counter() - start
+report['exceptions'] = [e.value for e in app.exception]
+print(json.dumps(report, default=str))
+"""
+
+
+def profile_cold_start(page, root=None):
+    """
+    Runs page once in a fresh interpreter and returns its profile report
+    """
+    root = root or os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, BONI_PROFILE_STARTUP='1')
+    result = subprocess.run([sys.executable, '-c', _COLD_RUN.format(root=root, page=os.path.join(root, page))],
+                            cwd=root, env=env, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    pages = (argv if argv is not None else sys.argv[1:]) or PAGES
+    for page in pages:
+        report = profile_cold_start(page)
+        print(f"{page}: first run {report['first_run_seconds']:.3f}s "
+              f"(streamlit import {report['streamlit_seconds']:.3f}s)")
+        for row in report['imports'][:8]:
+            print(f"    {row['module']:<20} {row['seconds']:.3f}s")
+        for error in report['exceptions']:
+            print(f"    exception: {error}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+import shared_cache
+
+ONE_DAY = pd.Timedelta(days=1)
+
+
+class Rollups:
+    """
+    Per member prefix sums over one day axis, so a date range total
+    is the difference of two lookups whatever the range:
+        spend, meals - running totals of the days before each position
+        unique       - restaurants tried for the first time before it
+    Position i covers the days before start_date + i days, so row
+    member has n_days + 1 entries and position 0 is always zero
+    """
+
+    def __init__(self, start_date, n_days, members, restaurants, spend, meals, unique, first_visit, visit_keys):
+        self.start_date = start_date
+        self.n_days = n_days
+        self.members = members
+        self.restaurants = restaurants
+        self.spend_prefix = spend
+        self.meals_prefix = meals
+        self.unique_prefix = unique
+        # day of each (member, restaurant) first visit, n_days if never visited
+        self.first_visit = first_visit
+        # sorted distinct (member, restaurant, day) visits as one integer each
+        self.visit_keys = visit_keys
+        self.member_codes = {member: code for code, member in enumerate(members)}
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in (self.spend_prefix, self.meals_prefix, self.unique_prefix,
+                                              self.first_visit, self.visit_keys))
+
+    def position(self, dates):
+        """
+        Number of axis days before each date, clipped to the axis.
+        Works on a single date or an array of them
+        """
+        if dates is None:
+            return self.n_days
+        offsets = np.ceil(np.asarray((pd.to_datetime(dates) - self.start_date) / ONE_DAY, dtype=float))
+        return np.clip(offsets, 0, self.n_days).astype(np.intp)
+
+    def _range(self, prefix, member, start, end):
+        code = self.member_codes.get(member)
+        if code is None:
+            return np.zeros_like(self.position(end), dtype=prefix.dtype)
+        row = prefix[code]
+        last = self.position(end)
+        if start is None:
+            return row[last]
+        # a start after end is an empty range, like unique()
+        return row[last] - row[np.minimum(self.position(start), last)]
+
+    def spend(self, member, start=None, end=None):
+        """
+        Spend on meals from start up to but excluding end
+        """
+        return self._range(self.spend_prefix, member, start, end)
+
+    def meals(self, member, start=None, end=None):
+        """
+        Meals eaten from start up to but excluding end
+        """
+        return self._range(self.meals_prefix, member, start, end)
+
+    def unique(self, member, start=None, end=None):
+        """
+        Distinct restaurants visited from start up to but excluding end.
+        Counting from the first day is a prefix lookup, a later start
+        needs a search per restaurant and only takes a single range
+        """
+        if start is None:
+            return self._range(self.unique_prefix, member, None, end)
+        code = self.member_codes.get(member)
+        if code is None:
+            return 0
+        first, last = self.position(start), self.position(end)
+        if first >= last:
+            return 0
+        pairs = (code * len(self.restaurants) + np.arange(len(self.restaurants))) * (self.n_days + 1)
+        visited = np.searchsorted(self.visit_keys, pairs + last) - np.searchsorted(self.visit_keys, pairs + first)
+        return int(np.count_nonzero(visited))
+
+    def first_visits(self, member):
+        """
+        Restaurant -> date of member's first visit, in visit order
+        """
+        code = self.member_codes.get(member)
+        if code is None:
+            return pd.Series(dtype='datetime64[ns]')
+        days = self.first_visit[code]
+        tried = np.flatnonzero(days < self.n_days)
+        tried = tried[np.argsort(days[tried], kind='stable')]
+        return pd.Series(self.start_date + pd.to_timedelta(days[tried], unit='D'), index=self.restaurants[tried])
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+@shared_cache.shared_result
+def build_rollups(data_version, _df):
+    """
+    Rollups of every member's meals in _df, the day axis running from
+    the first to the last recorded meal. Cached per data_version
+    """
+    df = _df[_df['date'].notna()]
+    days = df['date'].dt.normalize()
+    start_date = days.min()
+    n_days = (days.max() - start_date).days + 1 if len(df) else 0
+    day = (days - start_date).dt.days.to_numpy(dtype=np.intp)
+    member_codes, members = pd.factorize(df['Member'], sort=True)
+    restaurant_codes, restaurants = pd.factorize(df['restaurant'], sort=True)
+    n_members, n_restaurants = len(members), len(restaurants)
+
+    # each day's totals land on the position after it, then run along the axis
+    cells = member_codes * (n_days + 1) + day + 1
+    size = n_members * (n_days + 1)
+    price = np.nan_to_num(df['discount_meal_price'].to_numpy(dtype=float))
+    spend = np.bincount(cells, weights=price, minlength=size).reshape(n_members, n_days + 1).cumsum(axis=1)
+    meals = np.bincount(cells, minlength=size).reshape(n_members, n_days + 1).cumsum(axis=1)
+
+    pair_codes = member_codes * n_restaurants + restaurant_codes
+    first_visit = np.full(n_members * n_restaurants, n_days, dtype=np.intp)
+    np.minimum.at(first_visit, pair_codes, day)
+    first_visit = first_visit.reshape(n_members, n_restaurants)
+    tried_member, tried_restaurant = np.nonzero(first_visit < n_days)
+    unique = np.bincount(tried_member * (n_days + 1) + first_visit[tried_member, tried_restaurant] + 1,
+                         minlength=size).reshape(n_members, n_days + 1).cumsum(axis=1)
+
+    visit_keys = np.unique(pair_codes.astype(np.int64) * (n_days + 1) + day)
+
+    return Rollups(start_date, n_days, np.asarray(members), np.asarray(restaurants),
+                   spend, meals, unique, first_visit, visit_keys)
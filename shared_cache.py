@@ -0,0 +1,375 @@
+"""
+Result cache shared by every process that points at the same cache
+location, so replicas behind a load balancer compute each view once per
+data version instead of once each. Sits under st.cache_*: a process
+checks its own memory first, then the shared store, and only computes
+on a miss - holding a per key file lock so other replicas asking for the
+same result wait for it rather than computing it too.
+
+Off unless BONI_SHARED_CACHE names a backend:
+    disk   - one pickle file per result in BONI_SHARED_CACHE_DIR
+    sqlite - one key-value table in BONI_SHARED_CACHE_DIR/results.sqlite3
+Entries expire after BONI_SHARED_CACHE_TTL seconds and the oldest are
+evicted once the store grows past BONI_SHARED_CACHE_MAX_MB. Keys include
+a hash of the app's modules and pages, so replicas running different
+code don't share results. Results are pickled, so only point replicas
+at a cache directory you trust.
+"""
+import abc
+import contextlib
+import functools
+import hashlib
+import inspect
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+
+from streamlit.logger import get_logger
+
+try:
+    import fcntl
+except ImportError:
+    # no cross-process locking, replicas may compute the same result at once
+    fcntl = None
+
+LOGGER = get_logger(__name__)
+
+SHARED_CACHE = os.environ.get('BONI_SHARED_CACHE', '').lower()
+CACHE_DIR = os.environ.get('BONI_SHARED_CACHE_DIR', 'data/cache')
+TTL_SECONDS = float(os.environ.get('BONI_SHARED_CACHE_TTL', 24 * 60 * 60))
+MAX_BYTES = int(float(os.environ.get('BONI_SHARED_CACHE_MAX_MB', 256)) * 2**20)
+# the disk store checks for expired entries at most this often
+SWEEP_SECONDS = 10 * 60
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# name -> class(directory, ttl, max_bytes) storing pickled results
+CACHE_BACKENDS = {}
+
+# function name -> hits, misses, writes and errors of this process
+_stats = defaultdict(lambda: defaultdict(int))
+_stats_lock = threading.Lock()
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def cache_backend(name):
+    """
+    Registers a store for BONI_SHARED_CACHE to pick by name
+    """
+    def register(cls):
+        CACHE_BACKENDS[name] = cls
+        return cls
+    return register
+
+
+class SharedStore(abc.ABC):
+    """
+    get(key) -> bytes or None, set(key, data) and evictions, plus the
+    per key lock files every backend shares
+    """
+
+    def __init__(self, directory, ttl=TTL_SECONDS, max_bytes=MAX_BYTES):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        os.makedirs(os.path.join(directory, 'locks'), exist_ok=True)
+
+    @contextlib.contextmanager
+    def lock(self, key):
+        """
+        Exclusive across processes for key, a no-op without fcntl
+        """
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.directory, 'locks', key), 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    @abc.abstractmethod
+    def get(self, key):
+        """
+        The bytes stored under key, None if missing or expired
+        """
+
+    @abc.abstractmethod
+    def set(self, key, data):
+        """
+        Stores data under key, evicting entries to stay within max_bytes
+        """
+
+
+@cache_backend('disk')
+class DiskStore(SharedStore):
+    """
+    One file per entry, written to a temporary name and renamed so
+    readers never see half an entry. The file's mtime is its age.
+    The store's size is counted as entries are written, the directory
+    is only walked when the count passes max_bytes or a sweep for
+    expired entries is due. Other replicas' writes are not counted,
+    the walk brings the count up to date
+    """
+
+    def __init__(self, directory, ttl=TTL_SECONDS, max_bytes=MAX_BYTES):
+        super().__init__(directory, ttl, max_bytes)
+        self._size_lock = threading.Lock()
+        self._size = None
+        self._next_sweep = 0.0
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + '.pkl')
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                return None
+            with open(path, 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def set(self, key, data):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        try:
+            replaced = os.path.getsize(path)
+        except OSError:
+            replaced = 0
+        os.replace(tmp_path, path)
+
+        with self._size_lock:
+            if self._size is not None:
+                self._size += len(data) - replaced
+            if self._size is None or self._size > self.max_bytes or time.time() >= self._next_sweep:
+                self._evict()
+
+    def _entries(self):
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            if os.path.basename(root) == 'locks':
+                continue
+            for name in files:
+                if not name.endswith('.pkl'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _evict(self):
+        # expired entries first, then the oldest until the store fits
+        now = time.time()
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for mtime, size, path in entries:
+            if now - mtime <= self.ttl and total <= self.max_bytes:
+                break
+            with contextlib.suppress(OSError):
+                os.remove(path)
+                with contextlib.suppress(OSError):
+                    os.remove(os.path.join(self.directory, 'locks', os.path.basename(path)[:-len('.pkl')]))
+                self.evictions += 1
+            total -= size
+        self._size = total
+        self._next_sweep = now + min(self.ttl, SWEEP_SECONDS)
+
+
+@cache_backend('sqlite')
+class SQLiteStore(SharedStore):
+    """
+    One table of (key, value, size, created, accessed) in WAL mode so
+    readers don't block the writer. Evicts least recently read first
+    """
+
+    def __init__(self, directory, ttl=TTL_SECONDS, max_bytes=MAX_BYTES):
+        super().__init__(directory, ttl, max_bytes)
+        self.path = os.path.join(directory, 'results.sqlite3')
+        self._local = threading.local()
+        connection = self._connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("""CREATE TABLE IF NOT EXISTS results (
+            key TEXT PRIMARY KEY, value BLOB, size INTEGER, created REAL, accessed REAL)""")
+        connection.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)")
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        return connection
+
+    def get(self, key):
+        connection = self._connection()
+        now = time.time()
+        row = connection.execute("SELECT value FROM results WHERE key = ? AND created > ?",
+                                 (key, now - self.ttl)).fetchone()
+        if row is None:
+            return None
+        connection.execute("UPDATE results SET accessed = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    def set(self, key, data):
+        connection = self._connection()
+        now = time.time()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)",
+                               (key, sqlite3.Binary(data), len(data), now, now))
+            expired = connection.execute("DELETE FROM results WHERE created <= ?", (now - self.ttl,)).rowcount
+            total = connection.execute("SELECT coalesce(sum(size), 0) FROM results").fetchone()[0]
+            evicted = 0
+            for old_key, size in connection.execute(
+                    "SELECT key, size FROM results WHERE key != ? ORDER BY accessed", (key,)).fetchall():
+                if total <= self.max_bytes:
+                    break
+                connection.execute("DELETE FROM results WHERE key = ?", (old_key,))
+                total -= size
+                evicted += 1
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        self.evictions += expired + evicted
+
+
+def get_backend():
+    """
+    The configured store, None when the shared cache is off
+    """
+    global _backend
+    if not SHARED_CACHE:
+        return None
+    with _backend_lock:
+        if _backend is None:
+            if SHARED_CACHE not in CACHE_BACKENDS:
+                LOGGER.warning("Unknown shared cache backend %r, not caching", SHARED_CACHE)
+                return None
+            _backend = CACHE_BACKENDS[SHARED_CACHE](CACHE_DIR)
+            LOGGER.info("Sharing results through the %s cache in %s", SHARED_CACHE, CACHE_DIR)
+        return _backend
+
+
+def _count(name, event):
+    with _stats_lock:
+        _stats[name][event] += 1
+
+
+@functools.lru_cache(maxsize=None)
+def code_version():
+    """
+    Hash of the app's modules and pages, computed once per process.
+    Part of every key, so a deploy doesn't read results computed by the
+    old code - even when the change is in a helper a cached function calls
+    """
+    digest = hashlib.blake2b(digest_size=8)
+    for directory in (APP_DIR, os.path.join(APP_DIR, 'pages')):
+        with contextlib.suppress(OSError):
+            for name in sorted(os.listdir(directory)):
+                if name.endswith('.py'):
+                    digest.update(name.encode())
+                    with open(os.path.join(directory, name), 'rb') as f:
+                        digest.update(f.read())
+    return digest.hexdigest()
+
+
+def cache_key(name, func, bound):
+    """
+    Hash of the app's code, the function and every argument not
+    starting with an underscore - the same arguments st.cache_* hashes.
+    Pages pass the data version, so a new version never reads an old entry
+    """
+    hashed = sorted((arg, value) for arg, value in bound.arguments.items() if not arg.startswith('_'))
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(code_version().encode())
+    digest.update(name.encode())
+    digest.update(func.__code__.co_code)
+    digest.update(pickle.dumps(hashed))
+    return digest.hexdigest()
+
+
+def shared_result(func):
+    """
+    Reads func's result from the shared cache, or computes it under the
+    key's lock and stores it for every other process. Goes under
+    st.cache_* so each process keeps its own copy in memory too
+    """
+    # pages all run as __main__, the file tells their functions apart
+    name = f'{os.path.splitext(os.path.basename(func.__code__.co_filename))[0]}.{func.__qualname__}'
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        backend = get_backend()
+        if backend is None:
+            return func(*args, **kwargs)
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        key = cache_key(name, func, bound)
+
+        result = _read(backend, name, key)
+        if result is not _MISSING:
+            return result
+        with backend.lock(key):
+            # another process may have stored it while we waited
+            result = _read(backend, name, key)
+            if result is not _MISSING:
+                return result
+            _count(name, 'misses')
+            result = func(*args, **kwargs)
+            try:
+                backend.set(key, pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL))
+                _count(name, 'writes')
+            except Exception:
+                LOGGER.exception("Could not store %s in the shared cache", name)
+                _count(name, 'errors')
+        return result
+
+    return wrapper
+
+
+# what _read returns on a miss, None is a result like any other
+_MISSING = object()
+
+
+def _read(backend, name, key):
+    try:
+        data = backend.get(key)
+        if data is None:
+            return _MISSING
+        result = pickle.loads(data)
+    except Exception:
+        # a broken entry is a miss, the result is computed again
+        LOGGER.exception("Could not read %s from the shared cache", name)
+        _count(name, 'errors')
+        return _MISSING
+    _count(name, 'hits')
+    return result
+
+
+def cache_stats():
+    """
+    This process's hits, misses, writes and errors per function,
+    and the store's evictions
+    """
+    with _stats_lock:
+        stats = {name: dict(counts) for name, counts in _stats.items()}
+    backend = _backend
+    return {
+        'backend': SHARED_CACHE or None,
+        'evictions': backend.evictions if backend is not None else 0,
+        'functions': stats,
+    }
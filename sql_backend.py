@@ -0,0 +1,316 @@
+"""
+Optional embedded SQL copy of the meal log. With BONI_SQL_BACKEND set the
+shared views (monthly totals, the leaderboard's (Member, restaurant) table
+and daily visits) are queried from a local database file instead of
+grouped in pandas, with member and date predicates pushed into the query
+so an index does the filtering. Results come back as Arrow tables.
+
+DuckDB is used when installed, otherwise the sqlite3 module. Dates are
+stored as ISO text in both so one dialect serves both engines.
+
+Replicas on one host share the SQLite file: a write holds a file lock
+and an immediate transaction, and whoever gets the lock second finds
+the version already written. DuckDB lets only one process open a file
+for writing, so each process keeps its own DuckDB file. Any failure
+turns the backend off for that call and the views are grouped in pandas.
+"""
+import atexit
+import contextlib
+import os
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from streamlit.logger import get_logger
+
+try:
+    import fcntl
+except ImportError:
+    # no cross-process lock, sqlite's own write lock and busy timeout still apply
+    fcntl = None
+
+LOGGER = get_logger(__name__)
+
+# '' leaves the backend off, 'auto' picks duckdb when installed, or name one
+SQL_BACKEND = os.environ.get('BONI_SQL_BACKEND', '').lower()
+
+DB_SUFFIXES = {'duckdb': '.duckdb', 'sqlite': '.sqlite3'}
+
+# seconds a sqlite statement waits for another process's write
+BUSY_TIMEOUT = 30
+
+MEAL_COLUMNS = {
+    'Member': 'TEXT',
+    'date': 'TEXT',
+    'time': 'TEXT',
+    'restaurant': 'TEXT',
+    'discount_meal_price': 'DOUBLE',
+}
+
+# one database per data file, shared by every session in the process
+_databases = {}
+_lock = threading.Lock()
+
+
+def available_engine(preferred='auto'):
+    """
+    'duckdb' if preferred allows it and it imports, else 'sqlite'
+    """
+    if preferred in ('auto', 'duckdb'):
+        try:
+            import duckdb  # noqa: F401
+            return 'duckdb'
+        except ImportError:
+            if preferred == 'duckdb':
+                LOGGER.warning("duckdb is not installed, using sqlite")
+    return 'sqlite'
+
+
+def database_path(csv_path, engine):
+    """
+    data/combined_data2.csv -> data/combined_data2.sqlite3, shared by
+    the replicas, or data/combined_data2.<pid>.duckdb for this process
+    """
+    base = os.path.splitext(csv_path)[0]
+    if engine == 'duckdb':
+        return f'{base}.{os.getpid()}{DB_SUFFIXES[engine]}'
+    return base + DB_SUFFIXES[engine]
+
+
+@contextlib.contextmanager
+def file_lock(path):
+    """
+    Exclusive across processes while held, a no-op without fcntl
+    """
+    if fcntl is None:
+        yield
+        return
+    with open(path, 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def meal_table(df):
+    """
+    The meal log as an Arrow table of the database column types
+    """
+    price = df['discount_meal_price'].to_numpy(dtype=float)
+    return pa.table({
+        'Member': pa.array(df['Member'].astype('string'), pa.string()),
+        'date': pa.array(df['date'].dt.strftime('%Y-%m-%d'), pa.string()),
+        'time': pa.array(df['time'].astype('string'), pa.string()),
+        'restaurant': pa.array(df['restaurant'].astype('string'), pa.string()),
+        # prices are whole cents, drop the float32 noise
+        'discount_meal_price': pa.array(np.round(price, 2), pa.float64(), mask=np.isnan(price)),
+    })
+
+
+def where(members=None, start=None, end=None):
+    """
+    (sql, params) of the member and date predicates, start
+    inclusive and end exclusive like the rollups
+    """
+    clauses, params = [], []
+    if members is not None:
+        members = list(members)
+        clauses.append(f"Member IN ({', '.join('?' * len(members))})" if members else "FALSE")
+        params.extend(members)
+    if start is not None:
+        clauses.append("date >= ?")
+        params.append(pd.Timestamp(start).strftime('%Y-%m-%d'))
+    if end is not None:
+        clauses.append("date < ?")
+        params.append(pd.Timestamp(end).strftime('%Y-%m-%d'))
+    return (' WHERE ' + ' AND '.join(clauses) if clauses else ''), params
+
+
+class MealDatabase:
+    """
+    The meal log in an embedded database file, with an index on
+    (Member, date) and the data version it was written from
+    """
+
+    def __init__(self, path, engine):
+        self.path = path
+        self.engine = engine
+        self._write_lock = threading.Lock()
+        self._local = threading.local()
+        self._connect_lock = threading.Lock()
+        self._duckdb_connection = None
+
+    def _connection(self):
+        # sqlite connections are per thread, duckdb hands out a cursor per thread
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            if self.engine == 'duckdb':
+                connection = self._duckdb().cursor()
+            else:
+                # autocommit, write() manages its own transaction
+                connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, isolation_level=None)
+                # readers keep reading the last version while another process writes
+                connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return connection
+
+    def _duckdb(self):
+        with self._connect_lock:
+            if self._duckdb_connection is None:
+                import duckdb
+                self._duckdb_connection = duckdb.connect(self.path)
+        return self._duckdb_connection
+
+    def version(self):
+        """
+        Data version the tables were written from, None if never written
+        """
+        try:
+            rows = self._connection().execute("SELECT value FROM meta WHERE key = 'version'").fetchall()
+        except Exception:
+            # no meta table yet - sqlite3 and duckdb raise different errors
+            return None
+        return rows[0][0] if rows else None
+
+    def write(self, df, version, new_rows=None, previous_version=None):
+        """
+        Brings the database to version in one transaction, so readers
+        see either the old or the new version. If it holds
+        previous_version and new_rows (the meals appended since) are
+        given only those are inserted, otherwise the log is replaced
+        with df. Does nothing if another process wrote version first
+        """
+        with self._write_lock, file_lock(self.path + '.lock'):
+            current = self.version()
+            if current == version:
+                return
+            connection = self._connection()
+            # immediate takes sqlite's write lock now, waiting up to BUSY_TIMEOUT for it
+            connection.execute("BEGIN IMMEDIATE" if self.engine == 'sqlite' else "BEGIN")
+            try:
+                if new_rows is not None and current is not None and current == previous_version:
+                    self._insert(connection, meal_table(new_rows))
+                    written = len(new_rows)
+                else:
+                    columns = ', '.join(f'{name} {kind}' for name, kind in MEAL_COLUMNS.items())
+                    connection.execute("DROP TABLE IF EXISTS meals")
+                    connection.execute(f"CREATE TABLE meals ({columns})")
+                    self._insert(connection, meal_table(df))
+                    connection.execute("CREATE INDEX meals_member_date ON meals (Member, date)")
+                    connection.execute("CREATE INDEX meals_date ON meals (date)")
+                    written = len(df)
+                connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+                connection.execute("DELETE FROM meta WHERE key = 'version'")
+                connection.execute("INSERT INTO meta VALUES ('version', ?)", [version])
+                connection.execute("COMMIT")
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+        LOGGER.info("Wrote %d meals to %s (version %s)", written, self.path, version)
+
+    def _insert(self, connection, table):
+        if self.engine == 'duckdb':
+            connection.register('incoming_meals', table)
+            connection.execute("INSERT INTO meals SELECT * FROM incoming_meals ORDER BY Member, date")
+            connection.unregister('incoming_meals')
+        else:
+            rows = zip(*(column.to_pylist() for column in table.columns))
+            connection.executemany(f"INSERT INTO meals VALUES ({', '.join('?' * len(MEAL_COLUMNS))})", rows)
+
+    def query(self, sql, params=()):
+        """
+        Runs sql and returns the result as an Arrow table
+        """
+        cursor = self._connection().execute(sql, list(params))
+        if self.engine == 'duckdb':
+            return cursor.fetch_arrow_table()
+        names = [column[0] for column in cursor.description]
+        columns = list(zip(*cursor.fetchall())) or [()] * len(names)
+        return pa.table({name: pa.array(values) for name, values in zip(names, columns)})
+
+
+def meal_database(data_version, path=None):
+    """
+    The process's database for the data file, brought up to date from
+    the shared frame when its version changes - an append only inserts
+    the appended meals. None when the backend is off, the loaded data
+    has moved past data_version or the database can't be written, so
+    callers fall back to pandas for that version
+    """
+    if not SQL_BACKEND:
+        return None
+    from data_loader import COMBINED_DATA_PATH, load_dataset
+    path = path or COMBINED_DATA_PATH
+    entry = load_dataset(path)
+    if entry['version'] != data_version:
+        return None
+
+    try:
+        with _lock:
+            db = _databases.get(path)
+            if db is None:
+                engine = available_engine(SQL_BACKEND)
+                db = _databases[path] = MealDatabase(database_path(path, engine), engine)
+                if engine == 'duckdb':
+                    atexit.register(_remove, db.path)
+            if db.version() != data_version:
+                db.write(entry['df'], data_version, entry.get('new_rows'), entry.get('appended_to'))
+    except Exception:
+        LOGGER.exception("SQL backend unavailable for version %s, grouping in pandas", data_version)
+        return None
+    return db
+
+
+def _remove(path):
+    # this process's own duckdb file and its write ahead log
+    for name in (path, path + '.wal', path + '.lock'):
+        with contextlib.suppress(OSError):
+            os.remove(name)
+
+
+# The queries behind the shared views, each with optional member and date
+# predicates. Column names match the pandas tables they replace
+
+def monthly_totals(db, members=None, start=None, end=None):
+    """
+    (Member, month, cost, Used) like MealAggregates.monthly_table,
+    month as 'YYYY-MM'
+    """
+    predicate, params = where(members, start, end)
+    return db.query(f"""
+        SELECT Member, substr(date, 1, 7) AS month,
+               coalesce(sum(discount_meal_price), 0) AS cost, count(*) AS Used
+        FROM meals{predicate}
+        GROUP BY Member, month
+        ORDER BY Member, month""", params)
+
+
+def member_restaurant_totals(db, members=None, start=None, end=None):
+    """
+    (Member, restaurant, visits, spend, priced, free) like
+    leaderboard.member_restaurant_table
+    """
+    predicate, params = where(members, start, end)
+    return db.query(f"""
+        SELECT Member, restaurant, count(*) AS visits,
+               coalesce(sum(discount_meal_price), 0) AS spend,
+               count(discount_meal_price) AS priced,
+               count(CASE WHEN discount_meal_price = 0 THEN 1 END) AS free
+        FROM meals{predicate}
+        GROUP BY Member, restaurant
+        ORDER BY Member, restaurant""", params)
+
+
+def daily_visits(db, members=None, start=None, end=None):
+    """
+    (Member, date, restaurant, visits) like MealAggregates.all_daily_visits
+    """
+    predicate, params = where(members, start, end)
+    return db.query(f"""
+        SELECT Member, date, restaurant, count(*) AS visits
+        FROM meals{predicate}
+        GROUP BY Member, date, restaurant
+        ORDER BY Member, date, restaurant""", params)
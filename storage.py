@@ -0,0 +1,105 @@
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+from pandas.api.types import union_categoricals
+from streamlit.logger import get_logger
+
+LOGGER = get_logger(__name__)
+
+STORE_SUFFIX = '.feather'
+
+# column types of the meal log once converted from csv
+MEAL_DTYPES = {
+    'time': 'string',
+    'restaurant': 'category',
+    'discount_meal_price': 'float32',
+    'Member': 'category',
+}
+
+# key in the arrow schema metadata recording which csv a store was built from
+SOURCE_VERSION_KEY = b'source_version'
+
+
+def store_path(csv_path):
+    """
+    data/combined_data2.csv -> data/combined_data2.feather
+    """
+    return os.path.splitext(csv_path)[0] + STORE_SUFFIX
+
+
+def read_meals_csv(source, names=None):
+    """
+    Parses a csv path or buffer straight into the typed columns.
+    names is given when parsing rows without a header
+    """
+    return pd.read_csv(source, dtype=MEAL_DTYPES, parse_dates=['date'], names=names, header=None if names else 'infer')
+
+
+def concat_meals(df, new_rows):
+    """
+    Appends new_rows to df keeping the categorical columns categorical.
+    Existing categories keep their codes, new ones are added at the end
+    """
+    for col, dtype in MEAL_DTYPES.items():
+        if dtype != 'category':
+            continue
+        categories = union_categoricals([df[col], new_rows[col]], sort_categories=False).categories
+        df = df.assign(**{col: df[col].cat.set_categories(categories)})
+        new_rows = new_rows.assign(**{col: new_rows[col].cat.set_categories(categories)})
+    return pd.concat([df, new_rows], ignore_index=True)
+
+
+def convert_csv(csv_path, source_version, path=None):
+    """
+    Writes csv_path as an uncompressed feather (arrow ipc) file,
+    read back without parsing or decompressing. Returns the parsed frame
+    """
+    path = path or store_path(csv_path)
+    df = read_meals_csv(csv_path)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[SOURCE_VERSION_KEY] = source_version.encode()
+    table = table.replace_schema_metadata(metadata)
+
+    # write then rename so a concurrent reader never sees half a file
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    feather.write_feather(table, tmp_path, compression='uncompressed')
+    os.replace(tmp_path, path)
+    LOGGER.info("Converted %s to %s", csv_path, path)
+    return df
+
+
+def stored_version(path):
+    """
+    Data version the store at path was built from, None if missing
+    """
+    if not os.path.exists(path):
+        return None
+    with pa.memory_map(path) as source:
+        schema = pa.ipc.open_file(source).schema
+    version = (schema.metadata or {}).get(SOURCE_VERSION_KEY)
+    return version.decode() if version else None
+
+
+def read_meals(csv_path, source_version, columns=None):
+    """
+    Reads the meal log through its columnar store, (re)building the
+    store when it is missing or was built from a different version
+    of the csv. columns projects to a subset of columns.
+    Falls back to parsing the csv if the store can't be written
+    """
+    path = store_path(csv_path)
+    if stored_version(path) != source_version:
+        try:
+            df = convert_csv(csv_path, source_version, path)
+        except OSError as e:
+            LOGGER.warning("Could not write %s, reading csv instead: %s", path, e)
+            df = read_meals_csv(csv_path)
+        return df[columns] if columns is not None else df
+
+    # the frame needs its own pandas columns (categories, float32), so
+    # they are copied out of the arrow buffers rather than mapped
+    table = feather.read_table(path, columns=columns, memory_map=False)
+    return table.to_pandas(self_destruct=True)
@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+import shared_cache
+
+
+def streak_table(df):
+    """
+    One row per streak of consecutive days with a meal, for every
+    member: Member, start, end, length.
+    df must be sorted by Member then date, as the shared frame is
+    """
+    days = pd.DataFrame({'Member': df['Member'].to_numpy(), 'day': df['date'].dt.normalize().to_numpy()})
+    days = days[~days.duplicated()]
+
+    members = days['Member'].to_numpy()
+    day_values = days['day'].to_numpy()
+    new_member = np.r_[True, members[1:] != members[:-1]]
+    not_next_day = np.r_[True, np.diff(day_values) != np.timedelta64(1, 'D')]
+    streak_id = np.cumsum(new_member | not_next_day)
+
+    streaks = days.groupby(streak_id).agg(Member=('Member', 'first'), start=('day', 'first'),
+                                          end=('day', 'last'), length=('day', 'size'))
+    return streaks.reset_index(drop=True)
+
+
+def gap_histogram(df):
+    """
+    Member, gap_days, count - how often each member went gap_days
+    days without a meal between two meal days.
+    df must be sorted by Member then date
+    """
+    days = pd.DataFrame({'Member': df['Member'].to_numpy(), 'day': df['date'].dt.normalize().to_numpy()})
+    days = days[~days.duplicated()]
+    same_member = np.r_[False, days['Member'].to_numpy()[1:] == days['Member'].to_numpy()[:-1]]
+    gaps = np.r_[0, np.diff(days['day'].to_numpy()).astype('timedelta64[D]').astype(int) - 1]
+    days = days.assign(gap_days=gaps)[same_member & (gaps > 0)]
+    return days.groupby(['Member', 'gap_days']).size().reset_index(name='count')
+
+
+def streak_summary(streaks, last_recorded_date):
+    """
+    Per member: longest streak and its dates, and the current streak -
+    the one running up to last_recorded_date, 0 if it has ended
+    """
+    longest = streaks.loc[streaks.groupby('Member')['length'].idxmax()].set_index('Member')
+    latest = streaks.groupby('Member').last()
+    current = latest['length'].where(latest['end'] >= pd.Timestamp(last_recorded_date).normalize(), 0)
+    return pd.DataFrame({
+        'longest': longest['length'],
+        'longest_start': longest['start'],
+        'longest_end': longest['end'],
+        'current': current,
+    }).sort_values(by='longest', ascending=False)
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
+@shared_cache.shared_result
+def get_streaks(data_version, _df):
+    """
+    Streak table, per member summary and gap histogram
+    for all members, computed once per data version
+    """
+    streaks = streak_table(_df)
+    return {
+        'streaks': streaks,
+        'summary': streak_summary(streaks, _df['date'].max()),
+        'gaps': gap_histogram(_df),
+    }
@@ -0,0 +1,76 @@
+"""
+FrameScheduler pacing and frame rate stats on a fake clock
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import animation
+from animation import FrameScheduler
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(animation.time, 'perf_counter', clock)
+    return clock
+
+
+def play(scheduler, clock, frames, frame_seconds=0.01):
+    """
+    Runs frames timer ticks on schedule, returns the days each advanced
+    """
+    steps = []
+    for _ in range(frames):
+        steps.append(scheduler.begin_frame())
+        clock.now += frame_seconds
+        scheduler.end_frame()
+        clock.now += scheduler.interval - frame_seconds
+    return steps
+
+
+def test_on_schedule(clock):
+    scheduler = FrameScheduler(target_fps=10)
+    scheduler.start()
+    assert play(scheduler, clock, 20) == [1] * 20
+    stats = scheduler.stats()
+    assert stats['achieved_fps'] == pytest.approx(10)
+    assert stats['dropped'] == 0
+    assert stats['mean_frame_seconds'] == pytest.approx(0.01)
+
+
+def test_late_timer_skips_days(clock):
+    scheduler = FrameScheduler(target_fps=10, max_skip=3)
+    scheduler.start()
+    play(scheduler, clock, 3)
+    clock.now += 0.25
+    assert scheduler.begin_frame() == 3
+    scheduler.end_frame()
+    clock.now += 5
+    # too far behind, the schedule starts again
+    assert scheduler.begin_frame() == 4
+    scheduler.end_frame()
+    assert scheduler.stats()['dropped'] == 5
+
+
+def test_pause_is_not_active_time(clock):
+    scheduler = FrameScheduler(target_fps=10)
+    scheduler.start()
+    play(scheduler, clock, 10)
+    # paused, then Run again
+    clock.now += 2
+    scheduler.start()
+    assert play(scheduler, clock, 10) == [1] * 10
+    assert scheduler.stats()['achieved_fps'] == pytest.approx(10)
+    assert scheduler.stats()['dropped'] == 0
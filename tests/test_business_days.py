@@ -0,0 +1,54 @@
+"""
+The numpy business day calendar against counting days one by one,
+and the voucher utilisation built on it
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from business_days import (HOLIDAY_TABLES, business_days_between, monthly_utilisation,
+                           working_days_per_month)
+
+
+def counted_business_days(start, end, holidays='SI'):
+    days = pd.DatetimeIndex([start + pd.Timedelta(days=i) for i in range((end - start).days)])
+    closed = {day for year in set(days.year) for day in HOLIDAY_TABLES[holidays](year)}
+    return sum(day.dayofweek < 5 and day not in closed for day in days)
+
+
+def test_business_days_between():
+    rng = np.random.default_rng(0)
+    first = pd.Timestamp('2023-01-01')
+    starts = first + pd.to_timedelta(rng.integers(0, 3 * 365, 40), unit='D')
+    ends = starts + pd.to_timedelta(rng.integers(0, 90, 40), unit='D')
+    for holidays in HOLIDAY_TABLES:
+        counts = business_days_between(starts, ends, holidays)
+        assert list(counts) == [counted_business_days(s, e, holidays) for s, e in zip(starts, ends)]
+    assert len(business_days_between([], [])) == 0
+
+
+def test_working_days_per_month():
+    months = pd.period_range('2024-01', '2024-12', freq='M')
+    counts = working_days_per_month(months)
+    # January loses New Year's two days, April Easter Monday, the 27th is a Saturday
+    assert counts[0] == 21
+    assert counts[3] == 21
+    assert list(counts) == [counted_business_days(month.start_time, (month + 1).start_time) for month in months]
+
+
+def test_monthly_utilisation():
+    monthly = pd.DataFrame({
+        'Member': ['Ana', 'Ana', 'Ben'],
+        'month': pd.PeriodIndex(['2024-01', '2024-02', '2024-01'], freq='M'),
+        'cost': [10.0, 20.0, 5.0],
+        'Used': [5, 30, 21],
+    })
+    utilisation = monthly_utilisation(monthly)
+    assert list(utilisation['working_days']) == [21, 20, 21]
+    # more meals than working days is not negative unused
+    assert list(utilisation['Unused']) == [16, 0, 0]
+    assert list(utilisation['Used']) == [5, 30, 21]
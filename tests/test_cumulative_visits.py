@@ -0,0 +1,97 @@
+"""
+The change point visit events against the plain pandas groupby /
+cumsum they replace, on synthetic meals
+"""
+import inspect
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import synthetic_dataset
+from cumulative_visits import build_visit_events
+
+DATASETS = {
+    'dense': dict(members=3, restaurants=40, years=1),
+    'sparse': dict(members=5, restaurants=15, years=0.5, meals_per_day=0.2, seed=1),
+}
+
+
+@pytest.fixture(scope='module', params=list(DATASETS))
+def dataset(request):
+    return synthetic_dataset(**DATASETS[request.param])
+
+
+@pytest.fixture(scope='module')
+def events(dataset):
+    # st.cache_* and the shared cache keep the function they wrap as __wrapped__
+    return inspect.unwrap(build_visit_events)(dataset['aggregates'], dataset['version'])
+
+
+def members(dataset):
+    return list(dataset['member_index'].slices)
+
+
+def sample_dates(df, n=6, seed=0):
+    """
+    Dates across the log, with its first and last day and either side of it
+    """
+    first, last = df['date'].min(), df['date'].max()
+    rng = np.random.default_rng(seed)
+    offsets = rng.integers(0, (last - first).days + 1, n)
+    return [first - pd.Timedelta(days=1), first, last, last + pd.Timedelta(days=3)] + \
+        [first + pd.Timedelta(days=int(offset)) for offset in offsets]
+
+
+def baseline_table(df, member, axis):
+    """
+    Running visits per restaurant of member on every day of axis
+    """
+    meals = df[df['Member'] == member]
+    daily = meals.groupby([meals['date'].dt.normalize(), meals['restaurant']], observed=True).size().unstack(fill_value=0)
+    daily = daily.reindex(axis, fill_value=0).cumsum()
+    return daily[sorted(daily.columns)]
+
+
+def test_member_table(dataset, events):
+    df = dataset['df']
+    axis = events.dates()
+    for member in members(dataset):
+        expected = baseline_table(df, member, axis)
+        visits = events.member(member)
+        for end_date in sample_dates(df):
+            table = visits.table(end_date)
+            rows = expected[expected.index <= end_date]
+            assert list(table.columns) == ['date'] + list(rows.columns)
+            assert (table['date'].to_numpy() == rows.index.to_numpy()).all()
+            np.testing.assert_array_equal(table.drop(columns='date').to_numpy(dtype=int), rows.to_numpy(dtype=int))
+        assert len(visits.table()) == len(axis)
+
+
+def test_member_day(dataset, events):
+    df = dataset['df']
+    axis = events.dates()
+    for member in members(dataset):
+        expected = baseline_table(df, member, axis)
+        visits = events.member(member)
+        for date in sample_dates(df):
+            rows = expected[expected.index <= date]
+            totals = rows.iloc[-1] if len(rows) else pd.Series(0, index=expected.columns)
+            totals = totals[totals > 0]
+            day = visits.day(date)
+            assert list(day['Restaurant']) == list(totals.index)
+            np.testing.assert_array_equal(day['Cumulative Visits'].to_numpy(dtype=int), totals.to_numpy(dtype=int))
+
+
+def test_frame(dataset, events):
+    df = dataset['df']
+    for date in sample_dates(df):
+        meals = df[df['date'] <= date]
+        expected = meals.groupby(['Member', 'restaurant'], observed=True).size()
+        frame = events.frame(date).set_index(['Member', 'Restaurant'])['Cumulative Visits'].sort_index()
+        assert list(frame.index) == list(expected.sort_index().index)
+        np.testing.assert_array_equal(frame.to_numpy(dtype=int), expected.sort_index().to_numpy(dtype=int))
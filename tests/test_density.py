@@ -0,0 +1,55 @@
+"""
+The binned price density against an exact Gaussian KDE of the
+same prices, and the binning it is built on
+"""
+import inspect
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import synthetic_meals
+from density import estimate_bandwidth, linear_bin, price_density
+
+
+def exact_kde(values, grid, bandwidth):
+    distances = (grid[:, None] - values[None, :]) / bandwidth
+    return np.exp(-0.5 * distances ** 2).sum(axis=1) / (len(values) * bandwidth * np.sqrt(2 * np.pi))
+
+
+def test_linear_bin_keeps_count_and_mean():
+    rng = np.random.default_rng(0)
+    values = rng.uniform(1, 5, 500)
+    codes = rng.integers(0, 3, 500)
+    grid = np.linspace(1, 5, 50)
+    counts = linear_bin(values, codes, 3, grid)
+    for code in range(3):
+        mine = values[codes == code]
+        assert counts[code].sum() == pytest.approx(len(mine))
+        assert (counts[code] * grid).sum() / counts[code].sum() == pytest.approx(mine.mean())
+
+
+@pytest.fixture(scope='module')
+def meals():
+    return synthetic_meals(members=3, restaurants=30, years=0.5)
+
+
+@pytest.mark.parametrize('bandwidth', [None, 0.4])
+def test_price_density(meals, bandwidth):
+    # st.cache_* and the shared cache keep the function they wrap as __wrapped__
+    density = inspect.unwrap(price_density)('test-density', meals, bandwidth=bandwidth)
+    priced = meals.dropna(subset=['discount_meal_price'])
+    prices = priced['discount_meal_price'].astype(float)
+    stats = prices.groupby(priced['Member'], observed=True).describe()
+    bandwidths = estimate_bandwidth(stats)
+    assert (bandwidths > 0).all()
+
+    for member, curve in density.groupby('Member', sort=False):
+        grid = curve['discount_meal_price'].to_numpy()
+        assert len(grid) == 200
+        member_bandwidth = bandwidths[member] if bandwidth is None else bandwidth
+        expected = exact_kde(prices[priced['Member'] == member].to_numpy(), grid, member_bandwidth)
+        np.testing.assert_allclose(curve['density'].to_numpy(), expected, atol=0.01 * expected.max())
@@ -0,0 +1,91 @@
+"""
+Appending meals with ingest.py and picking the append up in
+data_loader: dedupe, partial rows and the incrementally sorted frame
+against reading the whole file again
+"""
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import data_loader
+from aggregates import MealAggregates
+from benchmarks.synthetic import synthetic_meals
+from data_loader import MemberIndex, content_hash, load_dataset, sort_meals
+from ingest import append_meals
+from storage import read_meals_csv
+
+
+@pytest.fixture
+def log_path(tmp_path):
+    path = str(tmp_path / 'meals.csv')
+    synthetic_meals(members=3, restaurants=20, years=0.5).to_csv(path, index=False, date_format='%Y-%m-%d')
+    yield path
+    data_loader._loaded.pop(path, None)
+
+
+def new_meals(members=4, seed=5):
+    # a member new to the log and meals on days the log already has
+    meals = synthetic_meals(members=members, restaurants=25, years=0.6, meals_per_day=0.1, seed=seed)
+    return meals.astype({'Member': str, 'restaurant': str, 'time': object})
+
+
+def assert_matches_full_read(path):
+    entry = load_dataset(path)
+    expected = sort_meals(read_meals_csv(path))
+    pd.testing.assert_frame_equal(entry['df'], expected, check_categorical=False)
+    assert entry['member_index'].slices == MemberIndex(expected).slices
+    assert entry['version'] == content_hash(path)[0]
+    return entry
+
+
+def test_append_skips_logged_meals(log_path):
+    before = load_dataset(log_path)
+    rows = new_meals()
+    logged = before['df'].iloc[::50].astype({'Member': str, 'restaurant': str, 'time': object})
+    batch = pd.concat([rows, logged, rows.iloc[:5]], ignore_index=True)
+
+    appended = append_meals(batch, path=log_path)
+    assert len(appended) == len(rows.drop_duplicates(subset=['date', 'time', 'restaurant', 'Member']))
+    assert append_meals(batch, path=log_path).empty
+
+    entry = assert_matches_full_read(log_path)
+    assert entry['metrics']['appended_rows'] == len(appended)
+    assert entry['appended_to'] == before['version']
+    assert len(entry['df']) == len(before['df']) + len(appended)
+
+
+def test_partial_row_waits_for_its_newline(log_path):
+    before = load_dataset(log_path)
+    with open(log_path, 'a', newline='') as f:
+        f.write('2024-05-01,12:00,New Place,3.5,Member 000\n2024-05-02,12:30,New Pl')
+
+    entry = load_dataset(log_path)
+    assert entry['metrics']['appended_rows'] == 1
+    assert entry['size'] < os.path.getsize(log_path)
+    with open(log_path, 'rb') as f:
+        assert entry['version'] == content_hash(log_path, limit=entry['size'])[0]
+        assert f.read(entry['size']).endswith(b'\n')
+    assert len(entry['df']) == len(before['df']) + 1
+
+    with open(log_path, 'a', newline='') as f:
+        f.write('ace,4.1,Member 001\n')
+    entry = assert_matches_full_read(log_path)
+    assert entry['metrics']['appended_rows'] == 1
+    assert len(entry['df']) == len(before['df']) + 2
+
+
+def test_aggregates_follow_appends(log_path):
+    load_dataset(log_path)
+    append_meals(new_meals(seed=6), path=log_path)
+    append_meals(new_meals(members=5, seed=7), path=log_path)
+    entry = assert_matches_full_read(log_path)
+    expected = MealAggregates().update(entry['df'])
+    # appended keys go at the end, the order of the tables doesn't matter
+    for table in ['monthly_table', 'all_daily_visits']:
+        got, want = getattr(entry['aggregates'], table)(), getattr(expected, table)()
+        keys = list(want.columns[:-1]) if table == 'all_daily_visits' else ['Member', 'month']
+        pd.testing.assert_frame_equal(got.sort_values(keys, ignore_index=True), want.sort_values(keys, ignore_index=True))
@@ -0,0 +1,67 @@
+"""
+The leaderboard metrics from the (Member, restaurant) table against
+the same numbers taken straight from the meal log, and the awards
+"""
+import inspect
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import synthetic_meals
+from leaderboard import AWARDS, METRICS, award_winners, get_leaderboard
+
+
+@pytest.fixture(scope='module')
+def meals():
+    df = synthetic_meals(members=4, restaurants=30, years=0.5)
+    # a couple of McDonald's under different spellings
+    names = {'Restaurant 0003': "McDonald's Center", 'Restaurant 0007': "MCDONALD'S BTC"}
+    return df.assign(restaurant=df['restaurant'].cat.rename_categories(lambda name: names.get(name, name)))
+
+
+@pytest.fixture(scope='module')
+def metrics(meals):
+    # st.cache_* and the shared cache keep the function they wrap as __wrapped__
+    return inspect.unwrap(get_leaderboard)('test-leaderboard', meals)[1]
+
+
+def expected_metrics(meals):
+    by_member = meals.groupby('Member', observed=True)
+    price = meals['discount_meal_price'].astype(float)
+    return pd.DataFrame({
+        'meals': by_member.size(),
+        'unique_restaurants': by_member['restaurant'].nunique(),
+        'avg_meal_price': price.groupby(meals['Member'], observed=True).mean(),
+        'total_spend': price.groupby(meals['Member'], observed=True).sum(),
+        'most_visits_to_one': meals.groupby(['Member', 'restaurant'], observed=True).size().groupby(level='Member').max(),
+        'mcdonalds': meals['restaurant'].astype(str).str.lower().str.contains("mcdonald's")
+                     .groupby(meals['Member'], observed=True).sum(),
+        'free_meals': price.eq(0).groupby(meals['Member'], observed=True).sum(),
+    })
+
+
+def test_metrics(meals, metrics):
+    expected = expected_metrics(meals)
+    assert set(metrics.columns) == set(METRICS)
+    assert metrics['mcdonalds'].sum() > 0
+    for name in expected.columns:
+        np.testing.assert_allclose(metrics[name].reindex(expected.index).to_numpy(dtype=float),
+                                   expected[name].to_numpy(dtype=float), rtol=1e-5, err_msg=name)
+
+
+def test_award_winners():
+    metrics = pd.DataFrame({name: [1, 2, 3] for name in METRICS}, index=['Ana', 'Ben', 'Cene'])
+    metrics['avg_meal_price'] = [2.5, 1.5, 3.5]
+    winners = award_winners(metrics)
+    assert [label for label, _ in winners] == [award.label for award in AWARDS]
+    expected = {'max': 'Cene', 'min': 'Ana'}
+    for award, (_, winner) in zip(AWARDS, winners):
+        if award.metric == 'avg_meal_price':
+            assert winner == ('Cene' if award.best == 'max' else 'Ben')
+        else:
+            assert winner == expected[award.best]
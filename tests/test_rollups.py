@@ -0,0 +1,42 @@
+"""
+The prefix sum rollups against filtering and summing the meals
+directly, on synthetic meals
+"""
+import inspect
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import synthetic_dataset
+from rollups import build_rollups
+from test_cumulative_visits import DATASETS, members, sample_dates
+
+
+@pytest.fixture(scope='module', params=list(DATASETS))
+def dataset(request):
+    return synthetic_dataset(**DATASETS[request.param])
+
+
+@pytest.fixture(scope='module')
+def rollups(dataset):
+    # st.cache_* and the shared cache keep the function they wrap as __wrapped__
+    return inspect.unwrap(build_rollups)(dataset['version'], dataset['df'])
+
+
+def test_rollups(dataset, rollups):
+    df = dataset['df']
+    dates = sample_dates(df, seed=1)
+    ranges = [(None, end) for end in dates] + [(start, end) for start in dates[::2] for end in dates[1::2]]
+    for member in members(dataset) + ['Nobody']:
+        meals = df[df['Member'] == member]
+        for start, end in ranges:
+            in_range = meals['date'] < end
+            if start is not None:
+                in_range &= meals['date'] >= start
+            expected = meals[in_range]
+            assert rollups.meals(member, start, end) == len(expected)
+            assert rollups.spend(member, start, end) == pytest.approx(expected['discount_meal_price'].astype(float).sum())
+            assert rollups.unique(member, start, end) == expected['restaurant'].nunique()
@@ -0,0 +1,107 @@
+"""
+The shared result cache's stores and the wrapper reading through them,
+on cache directories in a temporary directory
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import shared_cache
+from shared_cache import CACHE_BACKENDS, SharedStore
+
+
+@pytest.fixture(params=list(CACHE_BACKENDS))
+def store_class(request):
+    return CACHE_BACKENDS[request.param]
+
+
+def test_store_is_abstract(tmp_path):
+    with pytest.raises(TypeError):
+        SharedStore(str(tmp_path))
+
+
+def test_get_and_set(tmp_path, store_class):
+    store = store_class(str(tmp_path))
+    assert store.get('a' * 32) is None
+    store.set('a' * 32, b'first')
+    store.set('b' * 32, b'second')
+    store.set('a' * 32, b'replaced')
+    assert store.get('a' * 32) == b'replaced'
+    assert store.get('b' * 32) == b'second'
+
+
+def test_expired_entries_are_misses(tmp_path, store_class):
+    store = store_class(str(tmp_path), ttl=-1)
+    store.set('a' * 32, b'data')
+    assert store.get('a' * 32) is None
+
+
+def test_evicts_oldest_past_max_bytes(tmp_path, store_class, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(shared_cache.time, 'time', lambda: now[0])
+    store = store_class(str(tmp_path), ttl=10 ** 6, max_bytes=250)
+    keys = [str(i) * 32 for i in range(5)]
+    for key in keys:
+        now[0] += 1
+        store.set(key, b'x' * 100)
+        if store_class is shared_cache.DiskStore:
+            os.utime(store._path(key), (now[0], now[0]))
+    assert store.evictions == 3
+    assert [store.get(key) is not None for key in keys] == [False, False, False, True, True]
+
+
+def test_disk_store_walks_only_when_needed(tmp_path, monkeypatch):
+    store = shared_cache.DiskStore(str(tmp_path), max_bytes=1000)
+    walks = []
+    entries = store._entries
+    monkeypatch.setattr(store, '_entries', lambda: walks.append(1) or entries())
+    for i in range(10):
+        store.set(f'{i:032d}', b'x' * 100)
+    # the first write counts what is already there, then writes are counted
+    assert len(walks) == 1
+    store.set(f'{10:032d}', b'x' * 100)
+    # past max_bytes
+    assert len(walks) == 2
+    assert store.evictions == 1
+    assert store._size == sum(size for _, size, _ in entries()) == 1000
+
+
+@pytest.fixture
+def backend(tmp_path, monkeypatch):
+    store = shared_cache.DiskStore(str(tmp_path))
+    monkeypatch.setattr(shared_cache, 'get_backend', lambda: store)
+    return store
+
+
+def test_cached_none_is_a_hit(backend):
+    calls = []
+
+    @shared_cache.shared_result
+    def nothing(data_version):
+        calls.append(data_version)
+        return None
+
+    assert nothing('v1') is None
+    assert nothing('v1') is None
+    assert calls == ['v1']
+    nothing('v2')
+    assert calls == ['v1', 'v2']
+
+
+def test_new_code_misses(backend, monkeypatch):
+    calls = []
+
+    @shared_cache.shared_result
+    def view(data_version, _df):
+        calls.append(data_version)
+        return {'rows': len(_df)}
+
+    assert view('v1', [1, 2]) == {'rows': 2}
+    # underscore arguments are not part of the key
+    assert view('v1', [1, 2, 3]) == {'rows': 2}
+    monkeypatch.setattr(shared_cache, 'code_version', lambda: 'another deploy')
+    assert view('v1', [1, 2, 3]) == {'rows': 3}
+    assert calls == ['v1', 'v1']
@@ -0,0 +1,103 @@
+"""
+The SQL backend's queries against the pandas tables they replace,
+on synthetic meals written to a database in a temporary directory
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sql_backend
+from aggregates import MealAggregates
+from benchmarks.synthetic import synthetic_meals
+from data_loader import sort_meals
+from leaderboard import member_restaurant_table
+from sql_backend import MealDatabase, daily_visits, member_restaurant_totals, monthly_totals
+from storage import concat_meals
+
+
+@pytest.fixture(params=['sqlite', 'duckdb'])
+def engine(request):
+    if request.param == 'duckdb':
+        pytest.importorskip('duckdb')
+    return request.param
+
+
+@pytest.fixture(scope='module')
+def meals():
+    return synthetic_meals(members=4, restaurants=25, years=1)
+
+
+@pytest.fixture
+def db(tmp_path, engine, meals):
+    db = MealDatabase(str(tmp_path / f'meals{sql_backend.DB_SUFFIXES[engine]}'), engine)
+    db.write(meals, 'v1')
+    return db
+
+
+def queried(table, keys):
+    df = table.to_pandas()
+    if 'date' in df:
+        df['date'] = pd.to_datetime(df['date'])
+    return df.set_index(keys).sort_index()
+
+
+def assert_same(queried_table, expected, keys):
+    expected = expected.set_index(keys).sort_index()
+    assert list(queried_table.index) == list(expected.index)
+    for column in expected.columns:
+        np.testing.assert_allclose(queried_table[column].to_numpy(dtype=float), expected[column].to_numpy(dtype=float),
+                                   rtol=1e-6, atol=1e-6, err_msg=column)
+
+
+def assert_matches_pandas(db, df, members=None, start=None, end=None):
+    in_range = pd.Series(True, index=df.index)
+    if members is not None:
+        in_range &= df['Member'].isin(members)
+    if start is not None:
+        in_range &= df['date'] >= start
+    if end is not None:
+        in_range &= df['date'] < end
+    df = df[in_range]
+    aggregates = MealAggregates().update(df)
+
+    monthly = aggregates.monthly_table()
+    monthly['month'] = monthly['month'].astype(str)
+    assert_same(queried(monthly_totals(db, members, start, end), ['Member', 'month']), monthly, ['Member', 'month'])
+
+    pairs = member_restaurant_table(df).reset_index().astype({'Member': str, 'restaurant': str})
+    assert_same(queried(member_restaurant_totals(db, members, start, end), ['Member', 'restaurant']),
+                pairs, ['Member', 'restaurant'])
+
+    keys = ['Member', 'date', 'restaurant']
+    assert_same(queried(daily_visits(db, members, start, end), keys), aggregates.all_daily_visits(), keys)
+
+
+def test_queries(db, meals):
+    assert db.version() == 'v1'
+    assert_matches_pandas(db, meals)
+
+
+def test_member_and_date_predicates(db, meals):
+    members = ['Member 001', 'Member 003']
+    start, end = pd.Timestamp('2024-01-01'), pd.Timestamp('2024-04-15')
+    assert_matches_pandas(db, meals, members=members)
+    assert_matches_pandas(db, meals, start=start, end=end)
+    assert_matches_pandas(db, meals, members=members[:1], start=start)
+    assert_matches_pandas(db, meals, members=[])
+
+
+def test_incremental_write(db, meals):
+    new_rows = synthetic_meals(members=5, restaurants=30, years=0.1, start='2024-10-01', seed=3)
+    combined = sort_meals(concat_meals(meals, new_rows))
+    db.write(combined, 'v2', new_rows=new_rows, previous_version='v1')
+    assert db.version() == 'v2'
+    assert_matches_pandas(db, combined)
+
+    # a version the database doesn't hold rewrites it from the frame
+    db.write(meals, 'v3', new_rows=new_rows, previous_version='v1')
+    assert_matches_pandas(db, meals)
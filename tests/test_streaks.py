@@ -0,0 +1,77 @@
+"""
+The vectorised streaks and gaps against walking each member's meal
+days one by one
+"""
+import inspect
+import os
+import sys
+from collections import Counter
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import synthetic_meals
+from data_loader import sort_meals
+from streaks import get_streaks
+
+
+def walked_streaks(df):
+    """
+    (Member, start, end, length) per streak and a Counter of gap lengths per member
+    """
+    streaks, gaps = [], {}
+    for member, meals in df.groupby('Member', observed=True, sort=False):
+        days = sorted(set(meals['date'].dt.normalize()))
+        gaps[member] = Counter()
+        start = previous = days[0]
+        for day in days[1:]:
+            gap = (day - previous).days - 1
+            if gap:
+                streaks.append((member, start, previous, (previous - start).days + 1))
+                gaps[member][gap] += 1
+                start = day
+            previous = day
+        streaks.append((member, start, previous, (previous - start).days + 1))
+    return pd.DataFrame(streaks, columns=['Member', 'start', 'end', 'length']), gaps
+
+
+def run_streaks(df):
+    # st.cache_* and the shared cache keep the function they wrap as __wrapped__
+    return inspect.unwrap(get_streaks)('test-streaks', df)
+
+
+def test_hand_made_log():
+    df = sort_meals(pd.DataFrame({
+        'date': pd.to_datetime(['2024-03-01', '2024-03-02', '2024-03-02', '2024-03-03', '2024-03-06',
+                                '2024-03-04', '2024-03-05', '2024-03-06']),
+        'Member': pd.Categorical(['Ana', 'Ana', 'Ana', 'Ana', 'Ana', 'Ben', 'Ben', 'Ben']),
+    }))
+    result = run_streaks(df)
+    assert result['streaks'].values.tolist() == [
+        ['Ana', pd.Timestamp('2024-03-01'), pd.Timestamp('2024-03-03'), 3],
+        ['Ana', pd.Timestamp('2024-03-06'), pd.Timestamp('2024-03-06'), 1],
+        ['Ben', pd.Timestamp('2024-03-04'), pd.Timestamp('2024-03-06'), 3],
+    ]
+    summary = result['summary']
+    assert summary.loc['Ana', 'longest'] == 3 and summary.loc['Ana', 'current'] == 1
+    assert summary.loc['Ben', 'longest'] == 3 and summary.loc['Ben', 'current'] == 3
+    assert result['gaps'].values.tolist() == [['Ana', 2, 1]]
+
+
+def test_synthetic_log():
+    df = synthetic_meals(members=4, restaurants=20, years=1, meals_per_day=0.5)
+    result = run_streaks(df)
+    expected, gaps = walked_streaks(df)
+    pd.testing.assert_frame_equal(result['streaks'].astype({'Member': str}), expected, check_dtype=False)
+
+    summary = result['summary']
+    last = df['date'].max()
+    for member, streaks in expected.groupby('Member'):
+        assert summary.loc[member, 'longest'] == streaks['length'].max()
+        assert summary.loc[member, 'current'] == (streaks['length'].iloc[-1] if streaks['end'].iloc[-1] >= last else 0)
+
+    histogram = result['gaps']
+    for member, counts in gaps.items():
+        rows = histogram[histogram['Member'] == member]
+        assert dict(zip(rows['gap_days'], rows['count'])) == dict(counts)
@@ -16,8 +16,8 @@ import inspect
 import textwrap
 
 import streamlit as st
-from PIL import Image
-import pandas as pd
+import warmup
+from assets import image_bytes
 
 def show_code(demo):
     """Showing the code of the demo."""
@@ -32,24 +32,14 @@ def show_code(demo):
 def create_header_triplet(image_path="boni-removebg-preview.png", title="Študentska **prehrana**", scalar=0.55):
     img, heading, member = st.columns([1, 8, 2])
     try:
-        pillow_image = Image.open(image_path)
-        new_image = pillow_image.resize((int(177 * scalar), int(197 * scalar)))
-        img.image(new_image)
+        img.image(image_bytes(image_path, size=(int(177 * scalar), int(197 * scalar))))
     except Exception as e:
         st.error(f"Error loading image: {e}")
     heading.markdown(f"# {title}")
 
     return img, heading, member
 
-def pre_process_df(df):
-    """
-    Any standard pre-processing of df
-    for all charts
-    """
-    df['date'] = pd.to_datetime(df['date'])
-    return df
-
-def initialise_session_states():
+def initialise_session_states(load_data=True):
     if 'member' not in st.session_state:
         st.session_state.member = 'Ben'
 
@@ -58,9 +48,41 @@ def initialise_session_states():
         #                             'Oskar', 'Linn', 'Sofia')
         st.session_state.members = ('Ben', 'Oskar', 'Tonda')
         
-    if 'combined_df' not in st.session_state:
-        combined_df = pre_process_df(pd.read_csv('data/combined_data2.csv'))
-        st.session_state.combined_df = combined_df
+    if not load_data:
+        # start loading and precomputing while the visitor is on this page
+        if 'warmup_started' not in st.session_state:
+            st.session_state.warmup_started = warmup.start()
+        return
+
+    # imported here so pages without data don't pay for pandas
+    from data_loader import load_dataset
+    # shared across sessions - only a reference is kept per session
+    dataset = load_dataset()
+    if st.session_state.get('data_version') != dataset['version']:
+        st.session_state.combined_df = dataset['df']
+        st.session_state.member_index = dataset['member_index']
+        # the aggregates of this version, the loader may already hold a newer one
+        st.session_state.aggregates = dataset['aggregates']
+        st.session_state.data_version = dataset['version']
+        st.session_state.last_recorded_date = dataset['df']['date'].max()
+        # new data - precompute the other pages' views in the background
+        warmup.start(dataset)
+
+
+def wait_for_warmup(views, label):
+    """
+    True if views are ready. Otherwise shows a warming message instead of
+    blocking on them and reruns the page once the background worker is done
+    """
+    if warmup.ready(*views, version=st.session_state.data_version):
+        return True
+
+    @st.fragment(run_every=1)
+    def warming():
+        if warmup.ready(*views, version=st.session_state.data_version):
+            st.rerun()
+        status = warmup.warmup_status()
+        st.info(f"Warming up {label} with the latest data - {len(status['ready'])}/{status['total']} views ready")
 
-    if 'last_recorded_date' not in st.session_state:
-        st.session_state.last_recorded_date = st.session_state.combined_df['date'].max()
+    warming()
+    return False
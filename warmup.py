@@ -0,0 +1,164 @@
+"""
+Precomputes the shared views in a background thread whenever a new data
+version is seen, so the first visit to a page after an update or a restart
+finds its caches warm. Pages check ready() and show a warming message
+rather than blocking on a view that is still being computed.
+"""
+import os
+import threading
+import time
+
+from streamlit.logger import get_logger
+
+LOGGER = get_logger(__name__)
+
+# set BONI_WARMUP=0 to compute every view on first use instead
+WARMUP = os.environ.get('BONI_WARMUP', '1') != '0'
+
+# name -> function(entry) filling the caches of one view for a load_dataset() entry
+WARM_TASKS = {}
+
+_lock = threading.Lock()
+_status = {'version': None, 'state': 'idle', 'ready': [], 'total': 0, 'current': None,
+           'started': None, 'finished': None, 'errors': []}
+
+
+def warm_task(name):
+    """
+    Registers a view to precompute. Tasks call the cached functions
+    with the same arguments as the pages so they fill the same entries
+    """
+    def register(func):
+        WARM_TASKS[name] = func
+        return func
+    return register
+
+
+# heavy modules are imported inside the tasks so the landing page can
+# start warming without paying for them
+@warm_task('cumulative visits')
+def warm_visit_events(entry):
+    from cumulative_visits import build_visit_events
+    build_visit_events(entry['aggregates'], entry['version'])
+
+@warm_task('rollups')
+def warm_rollups(entry):
+    from rollups import build_rollups
+    build_rollups(entry['version'], entry['df'])
+
+@warm_task('monthly aggregates')
+def warm_monthly_utilisation(entry):
+    from business_days import get_monthly_utilisation
+    get_monthly_utilisation(entry['version'], entry['aggregates'])
+
+@warm_task('streaks')
+def warm_streaks(entry):
+    from streaks import get_streaks
+    get_streaks(entry['version'], entry['df'])
+
+@warm_task('leaderboard')
+def warm_leaderboard(entry):
+    from leaderboard import get_leaderboard
+    get_leaderboard(entry['version'], entry['df'])
+
+@warm_task('price density')
+def warm_price_density(entry):
+    from density import price_density
+    price_density(entry['version'], entry['df'])
+
+# the per member view, after the shared views it is built from
+
+@warm_task('member dashboards')
+def warm_dashboards(entry):
+    from dashboard import DASHBOARD_CACHE_ENTRIES, get_dashboard_aggregates
+    # warming more members than the cache keeps would evict the first ones again
+    for member in _members(entry, DASHBOARD_CACHE_ENTRIES):
+        get_dashboard_aggregates(member, entry['version'], entry['df'], entry['member_index'], entry['aggregates'])
+
+
+def _members(entry, limit):
+    """
+    Up to limit members of entry, those with the most meals first,
+    stopping early once a newer version is warming
+    """
+    slices = entry['member_index'].slices
+    for member in sorted(slices, key=lambda member: slices[member][0] - slices[member][1])[:limit]:
+        with _lock:
+            if _superseded(entry['version']):
+                return
+        yield member
+
+
+def start(entry=None):
+    """
+    Warms every registered view for entry in a background thread, or for
+    the latest data file when entry is None, loading it in the thread too.
+    Does nothing if that version is already warm or warming
+    """
+    if not WARMUP:
+        return False
+    with _lock:
+        if entry is not None and _status['version'] == entry['version']:
+            return False
+    threading.Thread(target=_warm, args=(entry,), name='boni-warmup', daemon=True).start()
+    return True
+
+
+def _superseded(version):
+    return _status['version'] != version
+
+
+def _warm(entry):
+    if entry is None:
+        from data_loader import load_dataset
+        entry = load_dataset()
+    version = entry['version']
+    with _lock:
+        if _status['version'] == version:
+            return
+        _status.update(version=version, state='warming', ready=[], total=len(WARM_TASKS), current=None,
+                       started=time.time(), finished=None, errors=[])
+
+    for name, task in list(WARM_TASKS.items()):
+        with _lock:
+            # a newer version started its own warm up
+            if _superseded(version):
+                return
+            _status['current'] = name
+        try:
+            task(entry)
+        except Exception as e:
+            # the page computes the view itself on first use
+            LOGGER.exception("Warming %s failed", name)
+            with _lock:
+                _status['errors'].append(f"{name}: {e}")
+        with _lock:
+            if _superseded(version):
+                return
+            _status['ready'].append(name)
+
+    with _lock:
+        if not _superseded(version):
+            _status.update(state='failed' if _status['errors'] else 'ready', current=None, finished=time.time())
+            LOGGER.info("Warmed %d views for data version %s in %.2fs", len(_status['ready']), version,
+                        _status['finished'] - _status['started'])
+
+
+def warmup_status():
+    """
+    Copy of the worker's progress: version, state (idle, warming, ready
+    or failed), ready views, total, current view, timings and errors
+    """
+    with _lock:
+        return dict(_status, ready=list(_status['ready']), errors=list(_status['errors']))
+
+
+def ready(*names, version=None):
+    """
+    True unless the named views are still being warmed for version
+    (the version being warmed if not given)
+    """
+    with _lock:
+        if _status['state'] != 'warming' or (version is not None and _superseded(version)):
+            return True
+        return all(name in _status['ready'] for name in names)